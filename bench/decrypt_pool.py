@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+
+from cryptography.hazmat.primitives import hashes, hmac, padding
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from retro_client.DecryptPool import DecryptPool
+
+"""\
+Decryption throughput of the DecryptPool for 1..N workers.
+
+The packets are decrypted by a stand-in for libretro's MsgHandler
+doing the same work per message: RSA-2048-OAEP (message key),
+HMAC-SHA256, Ed25519 (signature) and AES-256-CBC. So no account
+or server is needed.
+
+Every run delivers the messages in two bursts with an idle gap
+in between. The gap isn't part of the pool's throughput.
+
+Usage: python bench/decrypt_pool.py [MAX_WORKERS] [NUM_MSGS]
+
+"""
+
+NUM_FRIENDS = 16	# Senders, packets are sharded by sender
+MSG_SIZE    = 256	# Bytes of plaintext per message
+IDLE_SEC    = 1.0	# Gap between the two bursts
+
+
+class MsgHandler:
+	"""\
+	Stand-in for libretro.MsgHandler.
+	"""
+	def __init__(self):
+		self.rsa_key  = rsa.generate_private_key(65537, 2048)
+		self.sign_key = ed25519.Ed25519PrivateKey.generate()
+		self.verify_key = self.sign_key.public_key()
+
+
+	def make_packet(self, sender, text):
+		"""\
+		Encrypt text like a sending client would.
+		Return:
+		  Packet tuple (type, payload)
+		"""
+		aes_key,mac_key,iv = os.urandom(32),os.urandom(32),os.urandom(16)
+
+		padder = padding.PKCS7(128).padder()
+		data   = padder.update(text) + padder.finalize()
+		enc    = Cipher(algorithms.AES(aes_key), modes.CBC(iv))\
+				.encryptor()
+		data   = iv + enc.update(data) + enc.finalize()
+
+		h = hmac.HMAC(mac_key, hashes.SHA256())
+		h.update(data)
+		mac = h.finalize()
+
+		keys = self.rsa_key.public_key().encrypt(aes_key+mac_key,
+				self.__oaep())
+		sig  = self.sign_key.sign(keys+mac+data)
+		return (1, sender + keys + sig + mac + data)
+
+
+	def decrypt_msg(self, pckt_type, payload):
+		"""\
+		Decrypt a packet made by make_packet().
+		Return:
+		  Tuple (friend, msg)
+		"""
+		sender,keys = payload[:8],payload[8:264]
+		sig,mac     = payload[264:328],payload[328:360]
+		data        = payload[360:]
+
+		self.verify_key.verify(sig, keys+mac+data)
+		key = self.rsa_key.decrypt(keys, self.__oaep())
+
+		h = hmac.HMAC(key[32:], hashes.SHA256())
+		h.update(data)
+		h.verify(mac)
+
+		dec = Cipher(algorithms.AES(key[:32]), modes.CBC(data[:16]))\
+				.decryptor()
+		text = dec.update(data[16:]) + dec.finalize()
+		unpadder = padding.PKCS7(128).unpadder()
+		text = unpadder.update(text) + unpadder.finalize()
+		return sender,{'msg' : text}
+
+
+	def __oaep(self):
+		return asym_padding.OAEP(
+			mgf=asym_padding.MGF1(algorithm=hashes.SHA256()),
+			algorithm=hashes.SHA256(), label=None)
+
+
+def run(handler, packets, num_workers):
+	"""\
+	Decrypt all packets with given number of workers.
+	Return:
+	  Tuple (pool msgs/sec, wall clock msgs/sec incl. idle gap)
+	"""
+	def on_error(pckt, err):
+		raise SystemExit("Decrypting failed: "+err)
+
+	pool = DecryptPool(handler, lambda p,f,m: None, on_error,
+			num_workers)
+	pool.start()
+
+	half = len(packets)//2
+	t = time.perf_counter()
+	for pckt in packets[:half]:
+		pool.submit(pckt)
+	pool.join()
+	time.sleep(IDLE_SEC)
+	for pckt in packets[half:]:
+		pool.submit(pckt)
+	pool.join()
+	elapsed = time.perf_counter()-t
+
+	pool.stop()
+	return pool.msgs_per_sec(), len(packets)/elapsed
+
+
+def main():
+	max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+	num_msgs    = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+	handler = MsgHandler()
+	senders = [bytes([i])*8 for i in range(NUM_FRIENDS)]
+	packets = [handler.make_packet(senders[i % NUM_FRIENDS],
+			os.urandom(MSG_SIZE)) for i in range(num_msgs)]
+
+	print("{} msgs from {} senders, {} cpus, idle gap {:.1f}s"\
+		.format(num_msgs, NUM_FRIENDS, os.cpu_count(), IDLE_SEC))
+	print("workers   msgs/sec   speedup   wall msgs/sec")
+
+	base = None
+	for n in range(1, max_workers+1):
+		rate,wall = run(handler, packets, n)
+		base = base or rate
+		print("{:7d} {:10.0f} {:8.2f}x {:15.0f}".format(n, rate,
+			rate/base, wall))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,158 @@
+import curses
+import os
+import random
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from libretro.protocol import Proto
+
+from retro_client.ChatMsgWindow import ChatMsgWindow, LineIndex
+
+"""\
+LineIndex and ChatMsgWindow operations on long conversations.
+
+First the LineIndex alone: setting message heights (inserting
+index entries), offset lookups and deleting messages. Then a
+ChatMsgWindow drawn into a curses window of the terminal's size:
+opening the chat, scrolling one message and one screenful up and
+down, deleting messages and removing the unseen marker, every
+operation followed by a redraw (without refreshing the terminal).
+
+Must be run in a terminal.
+
+Usage: python bench/line_index.py [NUM_MSGS ...]
+
+"""
+
+NUM_OPS = 200	# Operations per measurement
+
+
+def make_msgs(n, num_unseen=100):
+	"""\
+	Create n chat messages of varying length, the last
+	num_unseen are unseen.
+	"""
+	return [{'from'   : 'me' if i%2 else 'bob',
+		 'time'   : '24-05-{:02d} 12:{:02d}'.format(1+i%28, i%60),
+		 'type'   : Proto.T_CHATMSG,
+		 'msg'    : "message {} ".format(i)*(1+i%20),
+		 'unseen' : 1 if i >= n-num_unseen else 0}
+		for i in range(n)]
+
+
+def timed(func, n=1):
+	"""\
+	Return:
+	  Microseconds per call of func (called n times)
+	"""
+	t = time.perf_counter()
+	for i in range(n):
+		func()
+	return (time.perf_counter()-t)*1e6/n
+
+
+def bench_index(n):
+	"""\
+	Return:
+	  List of (operation, microseconds)
+	"""
+	index = LineIndex(ChatMsgWindow.EST_HEIGHT)
+	order = list(range(n))
+	random.shuffle(order)
+	heights = iter(order)
+
+	res = [("set_height (all msgs)", timed(
+		lambda: index.set_height(next(heights), 2), n))]
+	res.append(("offset", timed(
+		lambda: index.offset(random.randrange(n)), NUM_OPS)))
+
+	# Deleting invalidates the prefix sums, so include
+	# the next lookup.
+	def delete():
+		index.delete(random.randrange(n-NUM_OPS))
+		index.offset(0)
+	res.append(("delete + offset", timed(delete, NUM_OPS)))
+	return res
+
+
+def make_gui(stdscr):
+	"""\
+	Minimal stand-in for RetroGui, as used by ChatMsgWindow.
+	"""
+	h,w = stdscr.getmaxyx()
+	gui = types.SimpleNamespace()
+	gui.W         = {'main' : curses.newwin(h, w, 0, 0)}
+	gui.colors    = {key : 0 for key in ('Wb', 'b', 'g', 'r')}
+	gui.cli       = types.SimpleNamespace(
+				account=types.SimpleNamespace(name='me'))
+	gui.msgSender = types.SimpleNamespace(PENDING='pending',
+				FAILED='failed',
+				get_state=lambda msg: None)
+	gui.chatView  = None
+	gui.request_redraw = lambda *args, **kwargs: None
+	gui.call_later     = lambda *args: None
+	return gui
+
+
+def bench_window(stdscr, n):
+	"""\
+	Return:
+	  List of (operation, microseconds)
+	"""
+	wMsg = ChatMsgWindow(make_gui(stdscr))
+	wMsg.friend = types.SimpleNamespace(name='bob')
+	msgs = make_msgs(n)
+	page = wMsg.W.getmaxyx()[0]//ChatMsgWindow.EST_HEIGHT
+
+	def open_chat():
+		wMsg.set_msgs(msgs)
+		wMsg.redraw(True)
+
+	def step(func, count=1):
+		def op():
+			for i in range(count):
+				func()
+			wMsg.redraw(True)
+		return op
+
+	res = [("open", timed(open_chat))]
+	res.append(("up", timed(step(wMsg.scroll_up), NUM_OPS)))
+	res.append(("down", timed(step(wMsg.scroll_down), NUM_OPS)))
+	res.append(("page up", timed(step(wMsg.scroll_up, page),
+		NUM_OPS)))
+	res.append(("page down", timed(step(wMsg.scroll_down, page),
+		NUM_OPS)))
+
+	wMsg.cy = n//2
+	wMsg.update_view()
+	res.append(("delete", timed(step(wMsg.delete_selected),
+		NUM_OPS)))
+	res.append(("unseen marker", timed(
+		step(wMsg.remove_unseen_marker))))
+	return res
+
+
+def main():
+	sizes = [int(n) for n in sys.argv[1:]] or [1000, 10000, 100000]
+
+	index = {n : bench_index(n) for n in sizes}
+	window = curses.wrapper(lambda stdscr:
+			{n : bench_window(stdscr, n) for n in sizes})
+
+	for title,results in (("LineIndex", index),
+			      ("ChatMsgWindow (with redraw)", window)):
+		print(title)
+		print("{:<24}".format("us per op")+"".join(
+			"{:>12}".format("n="+str(n)) for n in sizes))
+		for k,op in enumerate(results[sizes[0]]):
+			print("{:<24}".format(op[0])+"".join(
+				"{:12.1f}".format(results[n][k][1])
+				for n in sizes))
+		print()
+
+
+if __name__ == '__main__':
+	main()
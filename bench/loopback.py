@@ -0,0 +1,176 @@
+import datetime
+import os
+import socket
+import ssl
+import struct
+import sys
+import tempfile
+import threading
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+"""\
+Local TLS stand-ins for the network benchmarks.
+
+Server is a TLS server on 127.0.0.1 with a self-signed
+certificate, Client is a minimal replacement for libretro's
+RetroClient speaking a simple packet format (u16 type, u32
+length, payload). Like RetroClient, every send_packet() is a
+single sendall() on the TLS socket, so it becomes its own TLS
+record unless coalesced.
+
+"""
+
+HEADER = struct.Struct('<HI')
+
+
+def make_contexts():
+	"""\
+	Create TLS contexts with a self-signed certificate.
+	Return:
+	  Tuple (server context, client context)
+	"""
+	key  = ec.generate_private_key(ec.SECP256R1())
+	name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME,
+			"localhost")])
+	now  = datetime.datetime.now(datetime.timezone.utc)
+	cert = x509.CertificateBuilder().subject_name(name)\
+		.issuer_name(name).public_key(key.public_key())\
+		.serial_number(x509.random_serial_number())\
+		.not_valid_before(now)\
+		.not_valid_after(now+datetime.timedelta(days=1))\
+		.sign(key, hashes.SHA256())
+
+	with tempfile.TemporaryDirectory() as tmp:
+		certfile = os.path.join(tmp, "cert.pem")
+		keyfile  = os.path.join(tmp, "key.pem")
+		with open(certfile, 'wb') as f:
+			f.write(cert.public_bytes(serialization.Encoding.PEM))
+		with open(keyfile, 'wb') as f:
+			f.write(key.private_bytes(
+				serialization.Encoding.PEM,
+				serialization.PrivateFormat.PKCS8,
+				serialization.NoEncryption()))
+		sctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+		sctx.load_cert_chain(certfile, keyfile)
+
+	cctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+	cctx.check_hostname = False
+	cctx.verify_mode    = ssl.CERT_NONE
+	return sctx,cctx
+
+
+class Server:
+	"""\
+	TLS server calling handler(conn) for every accepted
+	connection (in its own thread).
+	"""
+	def __init__(self, ctx, handler):
+		self.ctx     = ctx
+		self.handler = handler
+		self.conns   = []
+		self.sock    = socket.socket()
+		self.sock.bind(('127.0.0.1', 0))
+		self.sock.listen()
+		self.addr    = self.sock.getsockname()
+		threading.Thread(target=self.__accept, daemon=True).start()
+
+
+	def close_all(self):
+		"""\
+		Close all accepted connections.
+		"""
+		for c in self.conns:
+			try:
+				c.shutdown(socket.SHUT_RDWR)
+				c.close()
+			except OSError:
+				pass
+		self.conns = []
+
+
+	def __accept(self):
+		while True:
+			c,_ = self.sock.accept()
+			threading.Thread(target=self.__handle, args=(c,),
+					daemon=True).start()
+
+
+	def __handle(self, c):
+		try:
+			c = self.ctx.wrap_socket(c, server_side=True)
+			self.conns.append(c)
+			self.handler(c)
+		except OSError:
+			pass
+
+
+def recv_exact(conn, n):
+	"""\
+	Receive exactly n bytes, None if the connection closed.
+	"""
+	buf = bytearray()
+	while len(buf) < n:
+		data = conn.recv(n-len(buf))
+		if not data:
+			return None
+		buf += data
+	return bytes(buf)
+
+
+class Client:
+	"""\
+	Stand-in for libretro's RetroClient.
+	"""
+	def __init__(self, ctx, addr):
+		self.ctx  = ctx
+		self.addr = addr
+		self.conn = None
+
+
+	def connect(self):
+		sock = socket.create_connection(self.addr)
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		self.conn = self.ctx.wrap_socket(sock)
+
+
+	def send_packet(self, pckt_type, data=b''):
+		self.conn.sendall(HEADER.pack(pckt_type, len(data))+data)
+
+
+	def recv_packet(self, timeout_sec=None):
+		"""\
+		Return:
+		  Packet tuple (type, payload), False on timeout,
+		  None if the connection got closed
+		"""
+		self.conn.settimeout(timeout_sec)
+		try:
+			hdr = self.conn.recv(HEADER.size)
+		except (socket.timeout, ssl.SSLWantReadError):
+			return False
+		except OSError:
+			return None
+		finally:
+			self.conn.settimeout(None)
+		if hdr and len(hdr) < HEADER.size:
+			rest = recv_exact(self.conn, HEADER.size-len(hdr))
+			hdr  = rest and hdr+rest
+		if not hdr:
+			return None
+		t,n = HEADER.unpack(hdr)
+		return (t, recv_exact(self.conn, n) if n else b'')
+
+
+	def close(self):
+		if self.conn:
+			try:
+				self.conn.close()
+			except OSError:
+				pass
+		self.conn = None
@@ -0,0 +1,128 @@
+import curses
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from retro_client.ui.markup import MARKS, compile_markup, draw_runs
+
+"""\
+Render speed of styled text in characters per second.
+
+Draws a screenful of lines with markup (see ui/markup.py) into a
+curses window, again and again for a second (without refreshing
+the terminal):
+
+  addch:    Scanning every line and calling addch() per
+	    character, as the chat and text windows did before
+	    the markup compiler.
+  runs:     compile_markup() and one addstr() per run, with the
+	    compiled lines cached (redrawing the same lines).
+  uncached: Same, but the cache is cleared every frame (new
+	    lines on every redraw).
+
+Must be run in a terminal.
+
+Usage: python bench/markup_render.py [NUM_LINES] [LINE_LEN]
+
+"""
+
+WORDS = "hello world the quick brown fox jumps over the lazy dog "\
+	"retro chat message".split()
+
+
+def make_line(length):
+	"""\
+	Random line, about 15% of the words with markup.
+	"""
+	words = []
+	while sum(len(w)+1 for w in words) < length:
+		w = random.choice(WORDS)
+		if random.random() < 0.15:
+			m = random.choice(list(MARKS))
+			w = m+w+m
+		words.append(w)
+	return " ".join(words)[:length]
+
+
+def draw_addch(W, y, line):
+	"""\
+	Per character drawing loop (before the markup compiler).
+	"""
+	active = {key : 0 for key in MARKS}
+	attr   = 0
+	i      = 0
+	W.move(y, 0)
+	while i < len(line):
+		mark = line[i:i+2]
+		if mark in MARKS:
+			if active[mark]:
+				attr &= ~MARKS[mark]
+				active[mark] = 0
+			else:
+				attr |= MARKS[mark]
+				active[mark] = 1
+			i += 2
+		else:
+			W.addch(line[i], attr)
+			i += 1
+
+
+def draw_compiled(W, y, line):
+	runs,_ = compile_markup(line)
+	draw_runs(W, y, 0, runs)
+
+
+def draw_uncached(W, y, line):
+	if y == 0:
+		compile_markup.cache_clear()
+	draw_compiled(W, y, line)
+
+
+def run(W, lines, draw):
+	"""\
+	Return:
+	  Tuple (chars/sec, milliseconds per frame)
+	"""
+	nchars = sum(len(l) for l in lines)
+	frames = 0
+	t = time.perf_counter()
+	while time.perf_counter()-t < 1.0:
+		W.erase()
+		for y,line in enumerate(lines):
+			draw(W, y, line)
+		W.noutrefresh()
+		frames += 1
+	elapsed = time.perf_counter()-t
+	return nchars*frames/elapsed, elapsed*1000/frames
+
+
+def main():
+	num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 35
+	line_len  = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+
+	random.seed(1)
+	lines = [make_line(line_len) for i in range(num_lines)]
+
+	def bench(stdscr):
+		W   = curses.newwin(num_lines+1, line_len+1, 0, 0)
+		res = []
+		for name,draw in (("addch", draw_addch),
+				  ("runs", draw_compiled),
+				  ("uncached", draw_uncached)):
+			# Best of 3
+			best = max(run(W, lines, draw) for i in range(3))
+			res.append((name, best))
+		return res
+
+	res = curses.wrapper(bench)
+	print("{} lines of {} chars".format(num_lines, line_len))
+	print("mode        Mchars/s   ms/frame")
+	for name,(cps,ms) in res:
+		print("{:<10} {:9.2f} {:10.3f}".format(name, cps/1e6, ms))
+
+
+if __name__ == '__main__':
+	main()
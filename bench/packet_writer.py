@@ -0,0 +1,107 @@
+import sys
+import threading
+import time
+
+import loopback
+
+from retro_client.PacketWriter import PacketWriter
+
+"""\
+Packets/sec and writes per packet of the PacketWriter.
+
+Sends a burst of packets (like an outbox flush) to a loopback
+TLS echo server, once with a send_packet() call per packet and
+once through the PacketWriter, which coalesces them into a few
+buffered writes. A packet counts as done when its echo is back.
+
+Usage: python bench/packet_writer.py [NUM_PCKTS] [PCKT_SIZE]
+
+"""
+
+T_CHATMSG = 1
+
+
+def echo(conn):
+	"""\
+	Echo server connection handler.
+	"""
+	while True:
+		data = conn.recv(65536)
+		if not data:
+			break
+		conn.sendall(data)
+
+
+class Drain(threading.Thread):
+	"""\
+	Reads the echoed bytes until nbytes were received.
+	"""
+	def __init__(self, conn, nbytes):
+		super().__init__(daemon=True)
+		self.conn   = conn
+		self.nbytes = nbytes
+
+
+	def run(self):
+		n = 0
+		while n < self.nbytes:
+			data = self.conn.recv(65536)
+			if not data:
+				break
+			n += len(data)
+
+
+def run_direct(cli, pckts):
+	"""\
+	Return:
+	  Number of sendall() calls
+	"""
+	for pckt in pckts:
+		cli.send_packet(*pckt)
+	return len(pckts)
+
+
+def run_writer(cli, pckts):
+	writer = PacketWriter(cli)
+	writer.start()
+	futs = [writer.send(*pckt) for pckt in pckts]
+	futs[-1].result()
+	writer.close()
+	return writer.num_writes
+
+
+def run(name, func, ctx, addr, pckts):
+	cli = loopback.Client(ctx, addr)
+	cli.connect()
+	nbytes = sum(loopback.HEADER.size+len(p[1]) for p in pckts)
+	drain  = Drain(cli.conn, nbytes)
+	drain.start()
+
+	t = time.perf_counter()
+	nwrites = func(cli, pckts)
+	drain.join()
+	elapsed = time.perf_counter()-t
+	cli.close()
+
+	print("{:<14} {:10.0f} {:10d} {:12.3f}".format(name,
+		len(pckts)/elapsed, nwrites, nwrites/len(pckts)))
+
+
+def main():
+	num_pckts = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+	size      = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+	sctx,cctx = loopback.make_contexts()
+	server = loopback.Server(sctx, echo)
+	pckts  = [(T_CHATMSG, bytes([i % 256])*size)
+			for i in range(num_pckts)]
+
+	print("{} packets of {} bytes".format(num_pckts, size))
+	print("mode             pckts/s     writes  writes/pckt")
+	for i in range(3):
+		run("send_packet", run_direct, cctx, server.addr, pckts)
+		run("PacketWriter", run_writer, cctx, server.addr, pckts)
+
+
+if __name__ == '__main__':
+	main()
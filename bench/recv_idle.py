@@ -0,0 +1,147 @@
+import random
+import sys
+import threading
+import time
+import types
+
+import loopback
+
+from retro_client.PacketDispatcher import PacketDispatcher
+from retro_client.RecvThread import RecvThread
+
+"""\
+Idle wakeups and shutdown latency of the receive thread.
+
+Compares the RecvThread (waiting in a selector on the TLS socket
+and a wakeup pipe) with the former polling loop, which called
+recv_packet(timeout_sec=recv_timeout) over and over. Both are
+connected to an idle loopback TLS server.
+
+Linux only (context switches are read from /proc).
+
+Usage: python bench/recv_idle.py [RECV_TIMEOUT] [IDLE_SEC]
+
+"""
+
+NUM_STOPS = 5	# Shutdown latency samples
+
+
+class PollingRecvThread(threading.Thread):
+	"""\
+	The receive loop before the selector core.
+	"""
+	def __init__(self, gui):
+		super().__init__(daemon=True)
+		self.cli          = gui.cli
+		self.recv_timeout = gui.conf.recv_timeout
+		self.done         = False
+		self.wakeups      = 0
+
+
+	def stop(self):
+		self.done = True
+
+
+	def run(self):
+		while not self.done:
+			pckt = self.cli.recv_packet(
+				timeout_sec=self.recv_timeout)
+			self.wakeups += 1
+			if pckt is None:
+				break
+
+
+def make_gui(cli, recv_timeout):
+	"""\
+	Minimal stand-in for RetroGui, as used by RecvThread.
+	"""
+	gui = types.SimpleNamespace(cli=cli, connected=True)
+	gui.conf        = types.SimpleNamespace(recv_timeout=recv_timeout)
+	gui.uiconf      = types.SimpleNamespace(decrypt_workers=0,
+				single_thread=False)
+	gui.dispatcher  = PacketDispatcher()
+	gui.evNotifier  = types.SimpleNamespace(
+				on_recv_backlog=lambda counts: None)
+	gui.reconnector = types.SimpleNamespace(
+				save_session=lambda sock: None,
+				connection_lost=lambda: None)
+	gui.sidebar = None
+	gui.error   = gui.info = lambda *args, **kwargs: None
+	gui.post    = lambda func, *args: None
+	gui.request_redraw = lambda *args, **kwargs: None
+	cli.msgHandler = cli.msgStore = None
+	return gui
+
+
+def ctx_switches(tid):
+	"""\
+	Get number of voluntary context switches of a thread.
+	"""
+	with open("/proc/self/task/{}/status".format(tid)) as f:
+		for line in f:
+			if line.startswith("voluntary_ctxt_switches"):
+				return int(line.split()[1])
+	return 0
+
+
+def start(cls, ctx, addr, recv_timeout):
+	cli = loopback.Client(ctx, addr)
+	cli.connect()
+	rt = cls(make_gui(cli, recv_timeout))
+	rt.daemon = True
+	rt.start()
+	return rt
+
+
+def stop(rt):
+	"""\
+	Stop the thread and return the seconds it took.
+	"""
+	t = time.perf_counter()
+	rt.stop()
+	rt.join()
+	rt.cli.close()
+	return time.perf_counter()-t
+
+
+def run(name, cls, ctx, addr, recv_timeout, idle_sec):
+	rt = start(cls, ctx, addr, recv_timeout)
+
+	# Leave backlog mode before counting
+	time.sleep(RecvThread.BACKLOG_QUIET_SEC*2)
+	wakeups = rt.wakeups
+	switches = ctx_switches(rt.native_id)
+	time.sleep(idle_sec)
+	wakeups  = rt.wakeups-wakeups
+	switches = ctx_switches(rt.native_id)-switches
+
+	# Stop at random points of the polling interval
+	lat = [stop(rt)]
+	for i in range(NUM_STOPS-1):
+		rt = start(cls, ctx, addr, recv_timeout)
+		time.sleep(1+random.uniform(0, recv_timeout))
+		lat.append(stop(rt))
+
+	print("{:<10} {:8d} {:10.1f} {:9.1f}ms {:9.1f}ms".format(name,
+		wakeups, switches*60/idle_sec, sum(lat)*1000/len(lat),
+		max(lat)*1000))
+
+
+def main():
+	recv_timeout = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+	idle_sec     = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+	sctx,cctx = loopback.make_contexts()
+	server = loopback.Server(sctx, lambda conn: conn.recv(1))
+
+	print("recv_timeout {:.0f}s, idle {:.0f}s".format(recv_timeout,
+		idle_sec))
+	print("thread      wakeups  ctxsw/min  stop avg   stop max")
+	run("polling", PollingRecvThread, cctx, server.addr,
+		recv_timeout, idle_sec)
+	run("selector", RecvThread, cctx, server.addr,
+		recv_timeout, idle_sec)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,247 @@
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+from libretro.Friend import Friend
+
+from . ChatView import ChatView
+
+LOG = logging.getLogger(__name__)
+
+"""\
+Cache of recently opened conversations.
+
+Opening a chat builds a ChatView, loads the latest messages from
+the message store and wraps them. Instead of dropping the view
+after closing the chat, it's kept here with its messages, wrapped
+lines, scroll position and unseen marker. Reopening the chat then
+doesn't touch the message store.
+
+Incoming messages are added to the cached view of their sender
+(see add_msg()), so a cached view is always up to date. The least
+recently opened views are dropped if more than max_chats are
+cached.
+
+Prefetch:
+  If the sidebar selection rests on a friend for PREFETCH_DELAY
+  seconds, the latest page of that conversation is fetched in a
+  background thread and wrapped for the chat window's size. So
+  opening the chat doesn't load anything. Only one fetch runs at
+  a time, moving on cancels a prefetch not started yet and drops
+  the result of a running one. At most max_prefetched views are
+  kept until opened, they don't evict opened conversations.
+
+NOTE: Only used by the main thread.
+
+"""
+
+class ChatCache:
+
+	PREFETCH_DELAY = 0.2	# Seconds the selection must rest
+
+	def __init__(self, gui, max_chats=8, max_prefetched=3):
+		"""\
+		Args:
+		  gui:            RetroGui instance
+		  max_chats:      Max number of cached conversations
+		  max_prefetched: Max number of prefetched, not
+				  opened conversations
+		"""
+		self.gui            = gui
+		self.max_chats      = max_chats
+		self.max_prefetched = max_prefetched
+		self.views          = OrderedDict()	# Friend name -> ChatView
+		self.prefetched     = OrderedDict()	# Friend name -> ChatView
+
+		self.prefetch_gen = 0		# Cancels prefetches
+		self.fetching     = None	# Friend name of running fetch
+		self.queued       = None	# (gen, friend) to fetch next
+		self.dirty        = False	# Got msg while fetching?
+
+		# Stats
+		self.num_hits      = 0	# Opened from cache
+		self.num_misses    = 0	# Loaded from message store
+		self.open_time     = 0	# Seconds spent opening
+		self.num_fetches   = 0	# Prefetches run
+		self.num_used      = 0	# Prefetched views opened
+		self.num_dropped   = 0	# Prefetch results dropped
+		self.fetch_time    = 0	# Seconds spent prefetching
+
+
+	def open(self, friend):
+		"""\
+		Get the chat view for given friend, it's loaded
+		from the message store if not cached.
+
+		Return:
+		  ChatView
+		"""
+		t  = time.perf_counter()
+		self.prefetch_gen += 1
+		cV = self.views.get(friend.name)
+		if not cV:
+			cV = self.prefetched.pop(friend.name, None)
+			if cV:
+				self.num_used += 1
+				self.views[friend.name] = cV
+				self.__evict()
+		if cV:
+			# Friend instance may have been replaced
+			cV.friend      = friend
+			cV.wMsg.friend = friend
+			self.views.move_to_end(friend.name)
+			self.num_hits += 1
+		else:
+			cV = ChatView(self.gui)
+			cV.load_chat(friend)
+			self.views[friend.name] = cV
+			self.num_misses += 1
+			self.__evict()
+		self.open_time += time.perf_counter()-t
+		return cV
+
+
+	def prefetch(self, friend):
+		"""\
+		Prefetch conversation with given friend (selected
+		in the sidebar) if not cached. Cancels the previous
+		prefetch.
+		"""
+		self.prefetch_gen += 1
+		if not friend or friend.status == Friend.UNKNOWN or\
+		   self.get(friend):
+			return
+		self.gui.call_later(self.PREFETCH_DELAY,
+			self.__start_prefetch, self.prefetch_gen, friend)
+
+
+	def get(self, friend):
+		"""\
+		Get the cached (or opened) chat view of given
+		friend or None.
+		"""
+		return self.views.get(friend.name) or\
+			self.prefetched.get(friend.name)
+
+
+	def add_msg(self, friend, msg):
+		"""\
+		Add message to the cached chat view of given
+		friend, if any.
+		"""
+		if friend.name == self.fetching:
+			# Prefetch result may miss it
+			self.dirty = True
+		cV = self.get(friend)
+		if not cV:
+			return
+		if cV.num_below and cV is not self.gui.chatView:
+			# Latest page isn't loaded, reload it
+			# when opened again.
+			self.discard(friend)
+			return
+		cV.add_msg(msg)
+
+
+	def discard(self, friend):
+		"""\
+		Drop the cached chat view of given friend and the
+		result of a running prefetch for the friend.
+		"""
+		if friend.name == self.fetching:
+			self.dirty = True
+		self.views.pop(friend.name, None)
+		self.prefetched.pop(friend.name, None)
+
+
+	def log_stats(self):
+		"""\
+		Log cache hits and misses.
+		"""
+		n = self.num_hits + self.num_misses
+		if n:
+			LOG.debug("ChatCache: {} opened, {} from cache ({} "\
+				"prefetched), avg open {:.2f}ms".format(n,
+				self.num_hits, self.num_used,
+				self.open_time*1000/n))
+		if self.num_fetches:
+			LOG.debug("ChatCache: {} prefetches, {} dropped, "\
+				"avg {:.2f}ms".format(self.num_fetches,
+				self.num_dropped, self.fetch_time*1000/
+				self.num_fetches))
+
+
+	# --- PRIVATE ------------------------------------------
+
+	def __evict(self):
+		"""\
+		Drop least recently opened views.
+		"""
+		while len(self.views) > self.max_chats:
+			self.views.popitem(last=False)
+
+
+	def __start_prefetch(self, gen, friend):
+		"""\
+		Start prefetch thread, if not cancelled meanwhile.
+		"""
+		if gen != self.prefetch_gen or self.gui.chatView or\
+		   self.get(friend):
+			return
+		if self.fetching:
+			# Started when the running one is done
+			self.queued = (gen, friend)
+			return
+
+		self.fetching = friend.name
+		self.dirty    = False
+		threading.Thread(target=self.__prefetch, daemon=True,
+			args=(gen, friend)).start()
+
+
+	def __prefetch(self, gen, friend):
+		"""\
+		Fetch latest messages (prefetch thread).
+		"""
+		t = time.perf_counter()
+		try:
+			msgs = self.gui.cli.msgStore.get_msgs(friend,
+					ChatView.PAGE_SIZE)
+		except Exception as e:
+			LOG.error("ChatCache: "+str(e))
+			msgs = None
+		self.gui.post(self.__prefetched, gen, friend, msgs,
+				time.perf_counter()-t)
+
+
+	def __prefetched(self, gen, friend, msgs, sec):
+		"""\
+		Prepare chat view from prefetched messages, if
+		still wanted (main thread).
+		"""
+		self.fetching     = None
+		self.num_fetches += 1
+		self.fetch_time  += sec
+
+		if msgs is None or self.dirty or gen != self.prefetch_gen\
+		   or self.gui.chatView or self.get(friend):
+			self.num_dropped += 1
+		else:
+			cV = ChatView(self.gui)
+			cV.set_chat(friend, msgs)
+
+			# Wrap for the chat window (full width,
+			# above the input window).
+			h,w = self.gui.stdscr.getmaxyx()
+			cV.wMsg.prewrap(w-4, h-5-self.gui.W_MAIN2_H)
+
+			self.prefetched[friend.name] = cV
+			if len(self.prefetched) > self.max_prefetched:
+				self.prefetched.popitem(last=False)
+
+		if self.queued:
+			gen,friend  = self.queued
+			self.queued = None
+			self.__start_prefetch(gen, friend)
@@ -1,36 +1,214 @@
 import curses
 import textwrap
+import itertools
 import time
+import enum
+
+from bisect import bisect_left
+from collections import OrderedDict
 
 from libretro.protocol import Proto
 from libretro.FileTransfer import filesize_to_string
 
+from . ui.markup import compile_markup, draw_runs
+
 """\
 Window for printing chat messages.
 The ChatMsgWindow is controlled by the ChatView class.
 
-Internally the messages are stored as a list of lines.
-Each list item is a tuple, where index 0 only is set
-if a line points to the beginning of a message.
+The messages are kept as records (message dicts, self.msgs) and
+their bodies are wrapped lazily: Only messages within the viewport
+(plus a margin) get wrapped and the wrapped lines are cached. So
+opening a chat with a long history costs about the same as opening
+a short one.
+
+The viewport is given by the index of the first message shown
+(self.top) and the number of its lines scrolled out at the top
+(self.skip). The selection (self.cy) is a message index.
 
-	index 0: message dict (or None)
-	index 1: text (string)
+Wrapped bodies are kept in a LRU cache (see WrapCache) keyed by
+message and width, so resizing back and forth doesn't rewrap. After
+a resize, the visible messages are rewrapped by the next redraw and
+the others in small chunks by the main loop (see __rewrap()), so
+the scrollbar gets exact again without blocking the input.
 
-There are some special lines, determined by their prefix.
+Line-offset index (see LineIndex): The start line of every message
+is found with a bisect lookup. Deleting a message only shifts the
+index entries behind it.
 
-A file info line:
-	"/F/F/F<FILENAME>/<FILESIZE_STRING>/<DOWNLOADED>"
+Only a part of the conversation is loaded (see ChatView). Older and
+newer pages are added with prepend_msgs()/append_msgs() and pages
+far from the viewport are dropped again (drop_first()/drop_last()).
+The view stays on the same messages meanwhile.
 
-An 'unseen marker' (line between seen and unseen messages)
-	"/U/U/U"
+The lines of a message are either a text line (string) or a
+special line (LineKind), which is drawn from the message itself:
 
-A dimmed line starts with:
-	"/D/D/D"
+	[LineKind.UNSEEN, LineKind.EMPTY]   (if first unseen)
+	LineKind.HEADER
+	"text", "text", ...                 (wrapped body)
+	LineKind.EMPTY
+
+The body of a file message is LineKind.FILE followed by
+LineKind.DOWNLOAD if the file isn't downloaded yet. Only the
+bodies are cached, as tuples.
 
 """
 
+class LineKind(enum.Enum):
+	HEADER   = 1	# Sender and time
+	FILE     = 2	# File name and size
+	DOWNLOAD = 3	# Download hint (dimmed)
+	UNSEEN   = 4	# Line above first unseen message
+	EMPTY    = 5	# Empty line
+
+
+class LineIndex:
+	"""\
+	Start line offsets of the chat messages.
+
+	A message not wrapped yet counts with an estimated height.
+	For messages with known height, the difference to the
+	estimate is kept in sorted parallel arrays (message index,
+	delta) with lazily built prefix sums. So the index only
+	grows with the number of wrapped messages, not with the
+	length of the conversation.
+	"""
+	def __init__(self, est_height):
+		self.est  = est_height
+		self.idx  = []		# Message indexes (sorted)
+		self.d    = []		# Height minus estimate
+		self.sums = [0]		# Prefix sums of d (or None)
+
+
+	def clear(self):
+		"""\
+		Forget all heights.
+		"""
+		self.idx  = []
+		self.d    = []
+		self.sums = [0]
+
+
+	def set_height(self, i, h):
+		"""\
+		Set height of message i.
+		"""
+		d = h-self.est
+		j = bisect_left(self.idx, i)
+		if j < len(self.idx) and self.idx[j] == i:
+			if self.d[j] == d:
+				return
+			self.d[j] = d
+		else:
+			self.idx.insert(j, i)
+			self.d.insert(j, d)
+		self.sums = None
+
+
+	def delete(self, i):
+		"""\
+		Remove message i, the following messages move up.
+		"""
+		j = bisect_left(self.idx, i)
+		if j < len(self.idx) and self.idx[j] == i:
+			del self.idx[j]
+			del self.d[j]
+			self.sums = None
+		for k in range(j, len(self.idx)):
+			self.idx[k] -= 1
+
+
+	def shift(self, n):
+		"""\
+		Insert (n > 0) or remove (n < 0) messages at the
+		front, the following messages move.
+		"""
+		if n < 0:
+			j = bisect_left(self.idx, -n)
+			del self.idx[:j]
+			del self.d[:j]
+			self.sums = None
+		self.idx = [i+n for i in self.idx]
+
+
+	def truncate(self, n):
+		"""\
+		Remove message n and all following.
+		"""
+		j = bisect_left(self.idx, n)
+		del self.idx[j:]
+		del self.d[j:]
+		self.sums = None
+
+
+	def offset(self, i):
+		"""\
+		Get first line of message i.
+		"""
+		if self.sums is None:
+			self.sums = list(itertools.accumulate(self.d,
+					initial=0))
+		return i*self.est + self.sums[bisect_left(self.idx, i)]
+
+
+class WrapCache:
+	"""\
+	LRU cache of wrapped message bodies, keyed by
+	(id(msg), width). An entry keeps its message, so the id
+	can't be reused by another message meanwhile.
+	"""
+	def __init__(self, max_entries):
+		self.max_entries = max_entries
+		self.entries     = OrderedDict()	# key -> (msg, lines)
+
+
+	def get(self, msg, width):
+		"""\
+		Get wrapped lines of msg or None if not cached.
+		"""
+		key   = (id(msg), width)
+		entry = self.entries.get(key)
+		if not entry or entry[0] is not msg:
+			return None
+		self.entries.move_to_end(key)
+		return entry[1]
+
+
+	def put(self, msg, width, lines):
+		"""\
+		Add wrapped lines, evicts least recently used.
+		"""
+		self.entries[(id(msg), width)] = (msg, lines)
+		self.entries.move_to_end((id(msg), width))
+		if len(self.entries) > self.max_entries:
+			self.entries.popitem(last=False)
+
+
+	def discard(self, msg, width=None):
+		"""\
+		Remove entry of msg for given width or for all
+		widths (if cached).
+		"""
+		if width is not None:
+			self.entries.pop((id(msg), width), None)
+			return
+		for key in [key for key,entry in self.entries.items()
+				if entry[0] is msg]:
+			del self.entries[key]
+
+
+	def clear(self):
+		self.entries.clear()
+
+
 class ChatMsgWindow:
 
+	EST_HEIGHT   = 3	# Estimated lines of a not wrapped message
+	MARGIN       = 10	# Messages wrapped above/below the viewport
+	MAX_WRAPPED  = 4096	# Max cached wrapped messages
+	REWRAP_CHUNK = 200	# Messages rewrapped per main loop step
+
 	def __init__(self, gui):
 
 		self.gui = gui
@@ -40,13 +218,25 @@ class ChatMsgWindow:
 		# Current communication partner.
 		self.friend = None
 
-		# All messages as a list of lines.
-		self.lines      = []
-		self.num_msgs   = 0	# Number of messages
+		# All messages (dicts)
+		self.msgs       = []
 		self.num_unseen = 0	# Number of unseen messages
+		self.unseen_i   = None	# Index of 1th unseen message
 
-		self.vy = 0	# Index of 1th line shown at screen
-		self.cy = 0	# Index of currently selected line
+		self.top  = 0	# Index of 1th message shown at screen
+		self.skip = 0	# Lines of top message scrolled out
+		self.cy   = 0	# Index of currently selected message
+
+		# Wrapped message bodies
+		self.wrapped = WrapCache(self.MAX_WRAPPED)
+
+		# Background rewrap after resize (see __rewrap)
+		self.rewrap_gen = 0	# Invalidates scheduled steps
+		self.rewrap_lo  = 0	# Next message to wrap upwards
+		self.rewrap_hi  = 0	# Next message to wrap downwards
+
+		# Start line of every message
+		self.index = LineIndex(self.EST_HEIGHT)
 
 		# Textwrapper for adjust message body to
 		# window width
@@ -56,14 +246,22 @@ class ChatMsgWindow:
 		# Screen content has changed?
 		self.changed = True
 
+		# Loading a page of messages?
+		self.loading = False
+
+		# Formatted message times, time string -> display
+		# string. Cleared if the day changes.
+		self.timestrs = {}
+		self.today    = None	# (year, month, day)
+
 
 	def get_selected(self):
 		"""\
 		Return the currently selected message (dict)
 		or None on error.
 		"""
-		if self.lines[self.cy][0] is not None:
-			return self.lines[self.cy][0]
+		if 0 <= self.cy < len(self.msgs):
+			return self.msgs[self.cy]
 		else:	return None
 
 
@@ -71,174 +269,429 @@ class ChatMsgWindow:
 		"""\
 		Delete currently selected message from view.
 		"""
-		msg_i = self.cy
-		msg_n = self.__selected_msg_nlines()
+		msg = self.get_selected()
+		if not msg:
+			return
 
-		for i in range(msg_n+1):
-			self.lines.pop(msg_i)
+		i = self.cy
+		self.msgs.pop(i)
+		self.wrapped.discard(msg, self.tw.width)
 
-		if self.cy > len(self.lines):
-			self.cy = self.__prev_msg_index()
-		self.changed = True
+		self.index.delete(i)
+
+		if msg['unseen'] == 1:
+			self.num_unseen -= 1
+		if self.unseen_i is not None:
+			if i < self.unseen_i:
+				self.unseen_i -= 1
+			if self.num_unseen <= 0 or\
+			   self.unseen_i >= len(self.msgs):
+				self.unseen_i = None
+
+		if self.cy >= len(self.msgs):
+			self.cy = max(0, len(self.msgs)-1)
+		if self.top > self.cy:
+			self.top,self.skip = self.cy,0
+		self.__adjust_view()
 
 
 	def add_msg(self, msg):
 		"""\
-		Add message to line list.
+		Add message.
 		Args:
 		  msg: Message dict
 		"""
-
 		if msg['unseen'] == 1:
 			# If given message is "unseen" and there
-			# were no "unseen" messages yet, add an
-			# "unseen"-marker-line.
+			# were no "unseen" messages yet, show an
+			# "unseen"-marker-line above.
 			if self.num_unseen == 0:
-				self.lines.append((None, "/U/U/U"))
-				self.lines.append((None, ""))
+				self.unseen_i = len(self.msgs)
 			self.num_unseen += 1
 
-		# Add message header (dict)
-		self.lines.append((msg, ""))
-
-		if msg['type'] == Proto.T_FILEMSG:
-			# File message
-			# TODO What happens if filename too long?
-			ssize = filesize_to_string(msg['size'])
-			self.lines.append((None, "/F/F/F{}/{}/{}"\
-				.format(msg['filename'], ssize,
-					msg['downloaded'])))
-			if not msg['downloaded']:
-				self.lines.append((None, '/D/D/D'\
-					'Press [ctrl+D] to download'))
-		else:
-			# Message
-			self.__add_wrap_text(msg['msg'])
-
-		self.lines.append((None, ""))
-		self.num_msgs += 1
+		self.msgs.append(msg)
 
 
 	def set_msgs(self, msgs=[]):
 		"""\
-		Set chat messages.
+		Set chat messages. Nothing is wrapped here.
 		"""
-		self.num_msgs   = 0
+		self.msgs       = list(msgs)
 		self.num_unseen = 0
+		self.unseen_i   = None
 		self.cy         = 0
-		self.lines      = []
-
-		for msg in msgs:
-			self.add_msg(msg)
+		self.top        = 0
+		self.skip       = 0
+		self.wrapped.clear()
+		self.index.clear()
+		self.timestrs = {}
+		self.rewrap_gen += 1
+
+		for i,msg in enumerate(self.msgs):
+			if msg['unseen'] == 1:
+				if self.unseen_i is None:
+					self.unseen_i = i
+				self.num_unseen += 1
 		self.reset_view()
 
 
+	def prepend_msgs(self, msgs, num_new=None):
+		"""\
+		Add older messages at the top, the viewport keeps
+		showing the same messages.
+
+		Args:
+		  msgs:    Message dicts (oldest first)
+		  num_new: Number of messages (from the start) not
+			   shown before, their unseen messages are
+			   counted (default: all)
+		"""
+		k = len(msgs)
+		if not k:
+			return
+		if num_new is None:
+			num_new = k
+
+		self.msgs[:0] = msgs
+		self.index.shift(k)
+		self.top       += k
+		self.cy        += k
+		self.rewrap_lo += k
+		self.rewrap_hi += k
+
+		if self.unseen_i is not None:
+			self.unseen_i += k
+		for i,msg in enumerate(msgs):
+			if msg['unseen'] != 1:
+				continue
+			if i < num_new:
+				self.num_unseen += 1
+			if self.unseen_i is None or i < self.unseen_i:
+				self.unseen_i = i
+		self.changed = True
+
+
+	def append_msgs(self, msgs):
+		"""\
+		Add newer messages dropped before (see
+		drop_last()) at the bottom.
+		"""
+		self.msgs += msgs
+		self.changed = True
+
+
+	def drop_first(self, n):
+		"""\
+		Remove the n oldest messages. They must not be
+		within the viewport.
+		"""
+		for msg in self.msgs[:n]:
+			self.wrapped.discard(msg, self.tw.width)
+		del self.msgs[:n]
+		self.index.shift(-n)
+		self.top       -= n
+		self.cy        -= n
+		self.rewrap_lo -= n
+		self.rewrap_hi -= n
+
+		# If the first unseen message is dropped, keep
+		# its (negative) index for prepending it again.
+		if self.unseen_i is not None:
+			self.unseen_i -= n
+		self.changed = True
+
+
+	def drop_last(self, n):
+		"""\
+		Remove the n newest messages. They must not be
+		within the viewport.
+		"""
+		for msg in self.msgs[-n:]:
+			self.wrapped.discard(msg, self.tw.width)
+		del self.msgs[-n:]
+		self.index.truncate(len(self.msgs))
+		self.changed = True
+
+
 	def reset_view(self):
 		"""\
-		Set view (self.vy) that latest message can be seen.
+		Set view that latest message can be seen.
+		"""
+		if self.msgs:
+			self.cy = len(self.msgs)-1
+		self.__adjust_view()
+
+
+	def set_file_downloaded(self, fileid):
+		"""\
+		Set the file message with given file id downloaded
+		and remove its download hint.
+
+		Return:
+		  True if the message is loaded
+		"""
+		for i in range(len(self.msgs)-1, -1, -1):
+			msg = self.msgs[i]
+			if msg['type'] == Proto.T_FILEMSG and\
+			   msg['fileid'] == fileid:
+				break
+		else:
+			return False
+
+		msg['downloaded'] = 1
+		self.wrapped.discard(msg)
+		self.__body(i)
+		self.changed = True
+		return True
+
+
+	def prewrap(self, width, height):
+		"""\
+		Wrap the latest messages filling a window of
+		given size (before the chat is shown).
+		"""
+		self.__set_width(width)
+		n = 0
+		i = len(self.msgs)-1
+		while i >= 0 and n < height:
+			n += self.__height(i)
+			i -= 1
+
+
+	def update_view(self):
+		"""\
+		Adjust view to the window size, keeping the
+		selected message.
 		"""
-		last_msg_y = self.__last_msg_index()
-		if last_msg_y != None:
-			self.cy = last_msg_y
 		self.__adjust_view()
 
 
 	def scroll_up(self):
 		""" Scroll up """
-		y = self.__prev_msg_index()
-		if y != None:
-			self.cy = y
+		if self.cy > 0:
+			self.cy -= 1
 			self.__adjust_view()
 
 
 	def scroll_down(self):
 		""" Scroll down """
-		y = self.__next_msg_index()
-		if y != None:
-			self.cy = y
+		if self.cy < len(self.msgs)-1:
+			self.cy += 1
 			self.__adjust_view()
 
 
 	def redraw(self, force_redraw=False):
 		"""\
-		Redraw window
-
-		Locks: self.gui.winLock
+		Redraw window. Only the messages within the
+		viewport are wrapped and drawn.
 		"""
 		if not self.changed and not force_redraw:
 			return
+		self.changed = False
 
-		self.gui.winLock.acquire()
-		try:
-			h,w = self.W.getmaxyx()
-			self.W.clear()
+		h,w = self.W.getmaxyx()
+		self.__set_width(w-4)
+		self.W.erase()
 
-			try:
-				self.__draw_headline(h, w)
+		# Message times like 'yesterday' change at midnight
+		now = time.localtime()
+		if now[:3] != self.today:
+			self.today    = now[:3]
+			self.timestrs = {}
 
-				y = 2
-				for i,line in enumerate(self.lines[self.vy:]):
-					if y >= h-1: break
+		try:
+			self.__draw_headline(h, w)
 
-					if line[0] is not None:
-						# Start of message
-						is_sel = self.vy+i == self.cy
-						self.__print_msg_header(y, line[0], is_sel)
-					elif line[1][:6] == '/F/F/F':
-						self.__print_file_msg(y, line[1])
-					elif line[1][:6] == "/D/D/D":
-						self.W.addstr(y, 2, line[1][6:], curses.A_DIM)
-					elif line[1] == "/U/U/U":
-						self.__print_unseen_marker_line(y, w)
-					else:
-						self.__print_msg(y, line[1])
+			y    = 2
+			i    = self.top
+			skip = self.skip
+			while y < h-1 and i < len(self.msgs):
+				for line in self.__lines(i)[skip:]:
+					if y >= h-1: break
+					self.__draw_line(y, w, i, line)
 					y += 1
+				skip = 0
+				i += 1
 
-				self.__draw_scrollbar(2, w-2, h-3)
-				self.W.border()
-			except:
-				# Screen too small
-				pass
-			self.W.refresh()
-		finally:
-			self.gui.winLock.release()
+			# Wrap some messages around the viewport,
+			# so scrolling doesn't work on estimates.
+			self.__wrap_range(self.top-self.MARGIN, self.top)
+			self.__wrap_range(i, i+self.MARGIN)
 
-		self.changed = False
+			self.__draw_scrollbar(2, w-2, h-3)
+			self.W.border()
+		except:
+			# Screen too small
+			pass
+		self.W.noutrefresh()
+
+
+	def set_all_seen(self):
+		"""\
+		Set all messages seen (closing the chat).
+		"""
+		for msg in self.msgs:
+			msg['unseen'] = 0
+		self.num_unseen = 0
+		self.remove_unseen_marker()
 
 
 	def remove_unseen_marker(self):
 		"""\
-		Remove line "/U/U/U" and the trailing one from self.lines.
+		Remove the unseen marker line.
 		"""
-		while True:
-			try:
-				i = self.lines.index((None,"/U/U/U"))
-				self.lines.pop(i)
-				self.lines.pop(i)
-			except ValueError:
-				break
+		self.unseen_i = None
+		self.changed  = True
 
 	def close(self):
 		"""\
 		Clear and refresh chat message window.
 		"""
-		self.gui.winLock.acquire()
-		try:
-			self.W.clear()
-			self.W.refresh()
-		finally:
-			self.gui.winLock.release()
+		self.W.clear()
+		self.W.refresh()
 
 	#-- PRIVATE ------------------------------------------------------
 
-	def __add_wrap_text(self, msg_text):
+	def __set_width(self, width):
+		"""\
+		Set wrap width. If it changed, all messages count
+		with estimated heights again until rewrapped. The
+		visible ones are wrapped on demand, the others by
+		the main loop (see __rewrap).
+		"""
+		if width == self.tw.width:
+			return
+		self.tw.width = width
+		self.index.clear()
+
+		self.rewrap_gen += 1
+		self.rewrap_lo   = self.top-1
+		self.rewrap_hi   = self.top
+		self.gui.call_later(0, self.__rewrap, self.rewrap_gen)
+
+
+	def __rewrap(self, gen):
+		"""\
+		Wrap the next chunk of messages for the current
+		width, going outwards from the viewport. Stops if
+		all messages are wrapped or the cache is full (the
+		cache shouldn't evict the visible messages).
+		"""
+		cV = self.gui.chatView
+		if gen != self.rewrap_gen or not cV or cV.wMsg is not self:
+			return
+
+		n = self.REWRAP_CHUNK//2
+		self.__wrap_range(self.rewrap_hi, self.rewrap_hi+n)
+		self.__wrap_range(self.rewrap_lo-n+1, self.rewrap_lo+1)
+		self.rewrap_hi += n
+		self.rewrap_lo -= n
+
+		num = min(self.rewrap_hi, len(self.msgs)) -\
+			max(self.rewrap_lo+1, 0)
+		if self.rewrap_lo < 0 and self.rewrap_hi >= len(self.msgs) or\
+		   num >= self.MAX_WRAPPED-self.REWRAP_CHUNK:
+			# Done, update scrollbar
+			self.changed = True
+			self.gui.request_redraw(self)
+			return
+		self.gui.call_later(0, self.__rewrap, gen)
+
+
+	def __body(self, i):
+		"""\
+		Get the body lines of message i, wrap the message
+		if not wrapped for the current width yet.
+		"""
+		msg  = self.msgs[i]
+		body = self.wrapped.get(msg, self.tw.width)
+		if body is not None:
+			# Cached, but the index may have been
+			# cleared since (resized back)
+			self.index.set_height(i, len(body)+2)
+			return body
+
+		if msg['type'] == Proto.T_FILEMSG:
+			# File message
+			# TODO What happens if filename too long?
+			if msg['downloaded']:
+				body = (LineKind.FILE,)
+			else:	body = (LineKind.FILE, LineKind.DOWNLOAD)
+		else:
+			# Message
+			body = tuple(l for line in msg['msg'].splitlines()
+					for l in self.tw.wrap(line))
+
+		self.wrapped.put(msg, self.tw.width, body)
+
+		# Update line-offset index
+		self.index.set_height(i, len(body)+2)
+		return body
+
+
+	def __lines(self, i):
+		"""\
+		Get all lines of message i (unseen marker, header,
+		body and trailing empty line).
+		"""
+		lines = []
+		if i == self.unseen_i:
+			lines += [LineKind.UNSEEN, LineKind.EMPTY]
+		lines.append(LineKind.HEADER)
+		lines += self.__body(i)
+		lines.append(LineKind.EMPTY)
+		return lines
+
+
+	def __height(self, i):
+		"""\
+		Get number of lines of message i, this wraps
+		the message if not done yet.
+		"""
+		n = len(self.__body(i))+2
+		if i == self.unseen_i:
+			n += 2
+		return n
+
+
+	def __wrap_range(self, start, end):
 		"""\
-		Add message text to line list.
+		Wrap messages start to end-1 (if not done yet).
 		"""
-		lines = msg_text.splitlines()
-		for line in lines:
-			for l in self.tw.wrap(line):
-				self.lines.append((None, l))
+		for i in range(max(0, start), min(end, len(self.msgs))):
+			self.__body(i)
+
+
+	def __offset(self, i):
+		"""\
+		Get the first line of message i (i=len(msgs) gives
+		the total number of lines). Messages not wrapped yet
+		count with an estimated height.
+		"""
+		y = self.index.offset(i)
+		if self.unseen_i is not None and 0 <= self.unseen_i < i:
+			y += 2
+		return y
+
+
+
+	def __draw_line(self, y, w, i, line):
+		"""\
+		Draw a line of message i at row y.
+		"""
+		if line.__class__ is str:
+			self.__print_msg(y, line)
+		elif line is LineKind.HEADER:
+			# Start of message
+			self.__print_msg_header(y, self.msgs[i],
+					i == self.cy)
+		elif line is LineKind.FILE:
+			self.__print_file_msg(y, self.msgs[i])
+		elif line is LineKind.DOWNLOAD:
+			self.W.addstr(y, 2, 'Press [ctrl+D] to download',
+					curses.A_DIM)
+		elif line is LineKind.UNSEEN:
+			self.__print_unseen_marker_line(y, w)
 
 	def __draw_headline(self, h, w):
 		"""\
@@ -247,6 +700,9 @@ class ChatMsgWindow:
 		self.W.addstr(1, 1, " "*(w-2), self.gui.colors['Wb'])
 		self.W.addstr(1, 1, " Conversation with " + self.friend.name,
 			self.gui.colors['Wb']|curses.A_BOLD)
+		if self.loading:
+			self.W.addstr(" (loading ...)",
+				self.gui.colors['Wb']|curses.A_DIM)
 
 
 	def __print_msg_header(self, y, msg, is_selected):
@@ -256,7 +712,10 @@ class ChatMsgWindow:
 		be shown underlined.
 		"""
 		sender = msg['from']
-		dt = self.__format_msgtime(msg['time'])
+		dt = self.timestrs.get(msg['time'])
+		if dt is None:
+			dt = self.__format_msgtime(msg['time'])
+			self.timestrs[msg['time']] = dt
 
 		if sender == self.gui.cli.account.name:
 			attr = self.gui.colors['b']
@@ -267,6 +726,13 @@ class ChatMsgWindow:
 		self.W.addstr(y, 1, sender, attr|u)
 		self.W.addstr(" ("+dt+")", curses.A_DIM|u)
 
+		# Outgoing message not sent yet?
+		state = self.gui.msgSender.get_state(msg)
+		if state == self.gui.msgSender.PENDING:
+			self.W.addstr(" sending ...", curses.A_DIM)
+		elif state == self.gui.msgSender.FAILED:
+			self.W.addstr(" not sent", self.gui.colors['r'])
+
 
 	def __print_unseen_marker_line(self, y, w):
 		"""\
@@ -278,57 +744,26 @@ class ChatMsgWindow:
 		self.W.addstr(y, int(w/2-len(s)/2), s, self.gui.colors['r'])
 
 
-	def __print_file_msg(self, y, line):
+	def __print_file_msg(self, y, msg):
 		"""\
-		Print file message.
-		/F/F/F<FILENAME>/<FILESIZE_STRING>/<DOWNLOADED>
+		Print file info (name and size) of given
+		file message.
 		"""
-		fname,fsize,downl = line[6:].split('/')
 		self.W.addstr(y, 2, 'File ')
-		self.W.addstr("'"+fname+"'", curses.A_BOLD)
-		self.W.addstr(" ("+fsize+")", curses.A_DIM)
+		self.W.addstr("'"+msg['filename']+"'", curses.A_BOLD)
+		self.W.addstr(" ("+filesize_to_string(msg['size'])+")",
+				curses.A_DIM)
 
 
 
 	def __print_msg(self, y, line):
 		"""\
 		Print message line to chat msg window.
-		This supports the following expression for styled
-		text ouput:
-
-		  **TEXT**      Bold text
-		  __TEXT__      Underlined text
-		  ??TEXT??      Dimmed text
-		  ~~TEXT~~      Reverse text
-		  ##TEXT##      Blinking text
-		"""
-		special = {
-			'**' : curses.A_BOLD,
-			'??' : curses.A_DIM,
-			'~~' : curses.A_REVERSE,
-			'__' : curses.A_UNDERLINE,
-			'##' : curses.A_BLINK
-		}
-		active = {}
-		for key in special.keys(): active[key] = 0
-
-		attr = 0
-		i = 0
-		self.W.move(y, 2)
-		while i < len(line):
-			ch = line[i]
-			if line[i:i+2] in special:
-				spec = line[i:i+2]
-				if active[spec] == 1:
-					attr &= ~special[spec]
-					active[spec] = 0
-				else:
-					attr |= special[spec]
-					active[spec] = 1
-				i += 2
-			else:
-				self.W.addch(ch, attr)
-				i += 1
+		This supports styled text output (see ui/markup.py),
+		the markup doesn't continue on the next line.
+		"""
+		runs,_ = compile_markup(line)
+		draw_runs(self.W, y, 2, runs)
 
 
 	def __draw_scrollbar(self, y, x, h):
@@ -336,14 +771,14 @@ class ChatMsgWindow:
 		Draw scrollbar at the right side of window.
 		"""
 		# Get max cursor y position
-		cymax = len(self.lines) #- h - 1
+		cymax = self.__offset(len(self.msgs))
 		if cymax <= 0: cymax = 1
 
 		# Get scrollbar block position
-		bar_y = int(self.cy * ((h-1) / cymax))
+		bar_y = int(self.__offset(self.cy) * ((h-1) / cymax))
 		if bar_y > h-3: bar_y = h-3
 
-		if len(self.lines) > h-1:
+		if cymax > h-1:
 			self.W.addch(y, x, curses.ACS_UARROW, curses.A_BOLD)
 			self.W.addch(y+1+bar_y, x, curses.ACS_BLOCK, curses.A_DIM)
 			self.W.addch(y+h-1, x, curses.ACS_DARROW, curses.A_BOLD)
@@ -352,7 +787,8 @@ class ChatMsgWindow:
 	def __format_msgtime(self, msg_time):
 		"""\
 		Get formatted time string from given
-		message time.
+		message time. This is called once per time
+		string and day (see self.timestrs).
 		"""
 		tm  = time.strptime(msg_time, "%y-%m-%d %H:%M")
 		now = time.localtime()
@@ -386,73 +822,41 @@ class ChatMsgWindow:
 		return time.strftime("%H:%M", tm)
 
 
-	def __prev_msg_index(self):
-		"""\
-		Returns index of beginning of previous
-		message in self.lines starting at self.cy.
-		If no previous message exists, None is returned.
-		"""
-		y = self.cy-1
-		while y >= 0:
-			if self.lines[y][0]:
-				return y
-			y -= 1
-		return None
-
-	def __next_msg_index(self):
-		"""\
-		Returns index of beginning of next
-		message in self.lines starting at self.cy.
-		If no next message exists, None is returned.
-		"""
-		y = self.cy+1
-		while y < len(self.lines):
-			if self.lines[y][0]:
-				return y
-			y += 1
-		return None
-
-	def __last_msg_index(self):
-		"""\
-		Get index of last message.
-		"""
-		y = len(self.lines)-1
-		while y >= 0:
-			if self.lines[y][0]:
-				return y
-			y -= 1
-		return None
-
-
-	def __selected_msg_nlines(self):
-		"""\
-		Get the number of lines, the currently
-		selected message is using (without headline).
-		"""
-		prefixes = ("/M/M/M","/U/U/U")
-		y = self.cy+1
-		n = 0
-		for line in self.lines[y:]:
-			if line[0] or line[1] in prefixes:
-				return n
-			n += 1
-		return n
-
 	def __adjust_view(self):
 		"""\
-		Adjusts the view (self.vy) that currently
-		selected message (self.cy) is within viewport.
+		Adjusts the view (self.top, self.skip) that currently
+		selected message (self.cy) is within viewport. Only
+		the messages between view and selection are wrapped.
 		"""
 		h,w = self.W.getmaxyx()
 		h -= 3
-
-		if self.cy < self.vy:
-			self.vy = self.cy
-
-		elif self.cy >= self.vy+h:
-			# Set view index, that we can see
-			# the selected message completely.
-			nlines = self.__selected_msg_nlines()
-			self.vy = self.cy-h+nlines+1
+		self.__set_width(w-4)
+
+		if self.cy < self.top or\
+		   (self.cy == self.top and self.skip > 0):
+			self.top,self.skip = self.cy,0
+
+		elif self.msgs:
+			# Lines from top of viewport to the end
+			# of the selected message
+			n = -self.skip
+			for i in range(self.top, self.cy+1):
+				n += self.__height(i)
+				if n > h: break
+
+			if n > h:
+				# Set view, that we can see the selected
+				# message completely (at the bottom).
+				n = 0
+				i = self.cy
+				while i >= 0:
+					n += self.__height(i)
+					if n >= h: break
+					i -= 1
+				self.top  = max(0, i)
+				self.skip = max(0, n-h)
+				if i == self.cy:
+					# Message higher than window
+					self.skip = 0
 
 		self.changed = True
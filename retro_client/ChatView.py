@@ -1,5 +1,7 @@
 import curses
 import logging
+import threading
+import time
 from base64 import b64decode
 
 from libretro.RetroClient import RetroClient
@@ -11,6 +13,7 @@ from . ui.TextEditWindow import *
 from . ui.FileBrowseWindow import *
 
 from . ChatMsgWindow import ChatMsgWindow
+from . LatencyStats import LatencyStats
 from . filetrans import SendFileThread, RecvFileThread
 
 LOG = logging.getLogger(__name__)
@@ -42,9 +45,27 @@ This will also control message sending and storing.
 [return]		Send message
 [shift]+[return]	Newline
 
+Loading:
+  The messages are loaded in a background thread, so the chat
+  opens right away. The newest screenful is fetched and drawn
+  first, then the rest of the latest page is added above it.
+
+Paging:
+  Only the latest page of messages is loaded when opening the
+  chat. Scrolling near the top (or bottom) of the loaded messages
+  fetches the previous (next) page in a background thread, the
+  messages are added without moving the viewport. If more than
+  MAX_LOADED messages are loaded, the ones far from the viewport
+  are dropped and fetched again if needed.
+
 """
 
 class ChatView:
+
+	PAGE_SIZE  = 50		# Messages per page
+	MAX_LOADED = 1000	# Max loaded messages
+	PREFETCH   = 10		# Fetch page if this near to the end
+
 	def __init__(self, gui):
 		"""\
 		Opens the chatview.
@@ -65,27 +86,72 @@ class ChatView:
 		# Textinput ()
 		self.wIn = TextEditWindow(gui.W['main2'],
 				headline="Input message/command:",
-				border=True, lock=self.gui.winLock)
+				border=True)
 
 		self.friend     = None	# Conversation partner
 		self.msgStore   = gui.cli.msgStore
 		self.msgHandler = gui.cli.msgHandler
 
+		# Paging
+		self.num_below = 0	# Newer messages not loaded
+		self.max_depth = 0	# Max messages loaded from end
+		self.at_start  = False	# Oldest message loaded?
+		self.fetching  = False	# Page fetch running?
+		self.loading   = False	# Latest page loading?
+		self.page_gen  = 0	# Invalidates running fetches
+		self.pageStats = LatencyStats()
+
+		# Select latest message when opened? The view
+		# is kept by the chat cache (see ChatCache),
+		# reopening it keeps the scroll position.
+		self.show_latest = True
+
+		# Seconds until the newest messages were drawn
+		self.first_paint = 0
+
 
 	def load_chat(self, friend):
 		"""\
-		Load last 100 messages from message database.
+		Load the latest page of messages from message
+		database in background (see __load()). The shown
+		messages are kept until the new ones are loaded.
+		Closing the chat doesn't stop loading, the view
+		is complete when opened again.
 		"""
-		self.friend      = friend
-		self.wMsg.friend = friend
+		self.friend       = friend
+		self.wMsg.friend  = friend
+		self.page_gen    += 1
+		self.fetching     = True	# No paging meanwhile
+		self.loading      = True
+		self.wMsg.loading = True
 
-		try:
-			msgs = self.msgStore.get_msgs(friend, 50)
-			self.wMsg.set_msgs(msgs)
-			return True
-		except Exception as e:
-			self.gui.error("MsgStore: "+str(e))
-			return False
+		# Number of messages filling the chat window
+		h,_ = self.gui.stdscr.getmaxyx()
+		n = min(self.PAGE_SIZE, h//ChatMsgWindow.EST_HEIGHT+1)
+
+		threading.Thread(target=self.__load, daemon=True,
+			args=(self.page_gen, friend, n,
+				time.perf_counter())).start()
+
+
+	def set_chat(self, friend, msgs, limit=PAGE_SIZE):
+		"""\
+		Set conversation partner and the latest messages
+		(see load_chat()).
+
+		Args:
+		  friend: Conversation partner
+		  msgs:   Latest messages from the message store
+		  limit:  Number of messages asked the store for
+		"""
+		self.friend       = friend
+		self.wMsg.friend  = friend
+		self.fetching     = False
+		self.num_below    = 0
+		self.max_depth    = len(msgs)
+		self.at_start     = len(msgs) < limit
+		self.wMsg.loading = False
+		self.wMsg.set_msgs(msgs)
 
 
 	def loop(self):
@@ -96,14 +162,19 @@ class ChatView:
 		self.gui.log_msg("Press ^H for help")
 
 		self.wIn.clear()
-		self.wMsg.reset_view()
-		self.redraw(True)
+		if self.show_latest:
+			self.wMsg.reset_view()
+		else:
+			# Reopened, keep scroll position
+			self.wMsg.update_view()
+		self.show_latest = False
+		self.gui.redraw(True)
 
 
 		while True:
 
 			try:
-				ch = self.wIn.getch()
+				ch = self.gui.wait_key(self.wIn)
 			except KeyboardInterrupt as e:
 				# Go back to main view on keyboard
 				# interrupt
@@ -151,10 +222,12 @@ class ChatView:
 			elif ch == self.keys['PUP']:
 				# Scroll msglist up
 				self.wMsg.scroll_up()
+				self.__fetch_page()
 
 			elif ch == self.keys['PDOWN']:
 				# Scroll msglist down
 				self.wMsg.scroll_down()
+				self.__fetch_page()
 
 			elif ch == curses.KEY_RESIZE:
 				# Resize screen
@@ -164,7 +237,7 @@ class ChatView:
 				# Handle text input
 				self.wIn.handle_event(ch)
 
-			self.redraw()
+			self.gui.redraw()
 
 		# Clear everything
 		self.wIn.clear()
@@ -176,16 +249,27 @@ class ChatView:
 		# of them.
 		self.msgStore.set_all_seen(self.friend)
 		self.friend.unseen_msgs = 0
+		self.wMsg.set_all_seen()
+
+		# Stop paging, the view may be cached. Loading
+		# the latest page goes on, otherwise the cached
+		# view would miss messages.
+		if not self.loading:
+			self.page_gen     += 1
+			self.fetching      = False
+			self.wMsg.loading  = False
+		self.__log_page_stats()
 
 
 	def redraw(self, force_redraw=False):
 		"""\
-		Redraw chat window.
+		Redraw chat window. This is called by gui.redraw(),
+		which also draws the topwindow and updates the screen.
 		"""
 		curses.curs_set(True)
-		self.gui.print_topwin()
 		self.wMsg.redraw(force_redraw)
 		self.wIn.redraw()
+		self.wIn.update_cursor()
 
 
 	def reset_cursor(self):
@@ -196,12 +280,37 @@ class ChatView:
 	def add_msg(self, msg):
 		"""\
 		Add text message to chat.
-		This will redraw the chatmsgview.
+		This will schedule a redraw of the chatmsgview.
+		NOTE: Must be called by the main thread, other
+		      threads have to use gui.post().
 		"""
-		self.wMsg.add_msg(msg)
-		self.wMsg.reset_view()
-		self.wMsg.redraw()
-		self.wIn.update_cursor()
+		if self.gui.chatView is not self:
+			# Cached view, adjusted when opened
+			self.wMsg.add_msg(msg)
+			self.show_latest = True
+			return
+
+		if self.num_below:
+			# Latest messages aren't loaded
+			self.load_chat(self.friend)
+		else:
+			self.wMsg.add_msg(msg)
+			self.wMsg.reset_view()
+		self.gui.request_redraw(self.wMsg)
+
+
+	def set_file_downloaded(self, fileid):
+		"""\
+		Update file message with given file id after it
+		was downloaded. If the message isn't loaded, it's
+		loaded from the message store as downloaded later.
+		NOTE: Must be called by the main thread.
+		"""
+		if not self.wMsg.set_file_downloaded(fileid):
+			return
+		if self.gui.chatView is self:
+			self.wMsg.update_view()
+			self.gui.request_redraw(self.wMsg)
 
 
 	# --- PRIVATE ------------------------------------------
@@ -210,43 +319,231 @@ class ChatView:
 		"""\
 		Send message.
 		1) Check if given text is valid
-		2) Check if connected to server
-		3) Encrypt message
-		4) Send message
-		5) Store message
-		6) Add message to ChatMsgWindow
+		2) Encrypt message
+		3) Queue message for sending (see MsgSender)
+		4) Store message to database
+		5) Add message to ChatMsgWindow
 		"""
 
 		if not text or text == '':
 			return False
 
-		if not self.gui.connected:
-			self.gui.log_msg("Not connected!",
-				error=True)
-			return False
-
 		# Encrypt message
 		msg,e2e_buf = self.msgHandler.make_msg(
 				self.friend, text,
 				Proto.T_CHATMSG)
 
-		# Send message
-		self.gui.cli.send_packet(
-				Proto.T_CHATMSG,
-				e2e_buf)
+		# Send message, if not connected it's sent
+		# after reconnecting.
+		self.gui.msgSender.send(msg, Proto.T_CHATMSG, e2e_buf)
+		if not self.gui.connected:
+			self.gui.log_msg("Not connected, message "\
+				"will be sent later")
 
 		# Store message to database
-		self.msgStore.add_msg(self.friend, msg)
+		msg['id'] = self.msgStore.add_msg(self.friend, msg)
 
 		# Add message to chat-message-view and
 		# update view.
+		self.add_msg(msg)
 		self.wMsg.remove_unseen_marker()
-		self.wMsg.add_msg(msg)
-		self.wMsg.reset_view()
 
 		return True
 
 
+	def __load(self, gen, friend, n, t):
+		"""\
+		Load the newest n messages, then the latest page
+		(loading thread).
+		"""
+		try:
+			msgs = self.msgStore.get_msgs(friend, n)
+			self.gui.post(self.__loaded_first, gen, msgs, n, t)
+
+			if len(msgs) == n < self.PAGE_SIZE:
+				msgs = self.msgStore.get_msgs(friend,
+						self.PAGE_SIZE)
+			self.gui.post(self.__loaded, gen, msgs, n, t)
+		except Exception as e:
+			self.gui.post(self.__load_failed, gen, str(e))
+
+
+	def __loaded_first(self, gen, msgs, n, t):
+		"""\
+		Show the newest messages (main thread).
+		"""
+		if gen != self.page_gen:
+			return
+		self.set_chat(self.friend, msgs, n)
+		self.fetching     = True
+		self.wMsg.loading = True
+		if self.gui.chatView is self:
+			self.gui.redraw()
+		self.first_paint = time.perf_counter()-t
+
+
+	def __loaded(self, gen, msgs, n, t):
+		"""\
+		Add the older messages of the latest page above
+		the shown ones (main thread).
+		"""
+		if gen != self.page_gen:
+			return
+		wMsg = self.wMsg
+
+		# Messages stored meanwhile shift the page,
+		# drop those already shown.
+		ids   = [m.get('id') for m in msgs]
+		first = wMsg.msgs[0].get('id') if wMsg.msgs else None
+		if first is not None and first in ids:
+			older = msgs[:ids.index(first)]
+		else:	older = msgs[:max(0, len(msgs)-n)]
+		wMsg.prepend_msgs(older)
+
+		self.max_depth    = len(wMsg.msgs)
+		self.at_start     = len(msgs) < self.PAGE_SIZE
+		self.fetching     = False
+		self.loading      = False
+		self.wMsg.loading = False
+		self.gui.request_redraw(wMsg)
+
+		LOG.debug("ChatView: Loaded {} msgs, first paint {:.1f}ms"\
+			" ({} msgs), full load {:.1f}ms".format(
+			len(msgs), self.first_paint*1000,
+			len(msgs)-len(older),
+			(time.perf_counter()-t)*1000))
+
+		# Selection may already be near the top
+		if self.gui.chatView is self:
+			self.__fetch_page()
+
+
+	def __load_failed(self, gen, err):
+		"""\
+		Loading failed (main thread), the view isn't
+		cached then.
+		"""
+		if gen != self.page_gen:
+			return
+		self.fetching     = False
+		self.loading      = False
+		self.wMsg.loading = False
+		self.gui.error("MsgStore: "+err)
+		self.gui.chatCache.discard(self.friend)
+
+
+	def __fetch_page(self):
+		"""\
+		Fetch the previous or next page in background if
+		the selection is near the top or bottom of the
+		loaded messages.
+		"""
+		if self.fetching:
+			return
+		cy = self.wMsg.cy
+		n  = len(self.wMsg.msgs)
+		if cy < self.PREFETCH and not self.at_start:
+			older = True
+		elif cy >= n-self.PREFETCH and self.num_below:
+			older = False
+		else:
+			return
+
+		self.fetching     = True
+		self.wMsg.loading = True
+		self.gui.request_redraw(self.wMsg)
+		threading.Thread(target=self.__fetch, daemon=True,
+			args=(self.page_gen, older, n+self.num_below,
+				self.num_below)).start()
+
+
+	def __fetch(self, gen, older, depth, num_below):
+		"""\
+		Fetch page from message store (background thread).
+		The store only returns the latest n messages, so
+		the page is cut from these.
+
+		Args:
+		  gen:       Page generation
+		  older:     Fetch previous (or next) page?
+		  depth:     Loaded messages plus num_below
+		  num_below: Newer messages not loaded
+		"""
+		t = time.perf_counter()
+		try:
+			n = depth+self.PAGE_SIZE if older else num_below
+			msgs = self.msgStore.get_msgs(self.friend, n)
+		except Exception as e:
+			self.gui.post(self.__fetched, gen, older, None,
+				depth, str(e))
+			return
+		self.pageStats.add(time.perf_counter()-t)
+		self.gui.post(self.__fetched, gen, older, msgs, depth)
+
+
+	def __fetched(self, gen, older, msgs, depth, err=None):
+		"""\
+		Add fetched page (main thread).
+		"""
+		if gen != self.page_gen:
+			return
+		self.fetching     = False
+		self.wMsg.loading = False
+		self.gui.request_redraw(self.wMsg)
+		if err:
+			self.gui.error("MsgStore: "+err)
+			return
+
+		wMsg = self.wMsg
+		if older:
+			page = msgs[:max(0, len(msgs)-depth)]
+			self.at_start = len(msgs) < depth+self.PAGE_SIZE
+
+			# Messages stored meanwhile shift the page,
+			# drop those already shown.
+			ids   = [m.get('id') for m in page]
+			first = wMsg.msgs[0].get('id') if wMsg.msgs else None
+			if first is not None and first in ids:
+				page = page[:ids.index(first)]
+
+			num_new = max(0, depth+len(page)-self.max_depth)
+			self.max_depth = max(self.max_depth,
+					depth+len(page))
+			wMsg.prepend_msgs(page, num_new)
+
+			# Drop newest messages far below the viewport
+			n = len(wMsg.msgs) - max(self.MAX_LOADED,
+					wMsg.cy+2*self.PAGE_SIZE)
+			if n > 0:
+				wMsg.drop_last(n)
+				self.num_below += n
+		else:
+			page = msgs[:self.PAGE_SIZE]
+			wMsg.append_msgs(page)
+			self.num_below -= len(page)
+
+			# Drop oldest messages far above the viewport
+			n = len(wMsg.msgs) - max(self.MAX_LOADED,
+					len(wMsg.msgs)-wMsg.cy+2*self.PAGE_SIZE)
+			if n > 0:
+				wMsg.drop_first(n)
+				self.at_start = False
+
+		# Still near the end?
+		self.__fetch_page()
+
+
+	def __log_page_stats(self):
+		"""\
+		Log page fetch latency.
+		"""
+		st = self.pageStats
+		if not st.count:
+			return
+		LOG.debug("ChatView: {} page fetches, {}".format(
+			st.count, st.summary()))
+
+
 	def __file_upload(self):
 		"""\
 		Opens a filebrowser and let user select file
@@ -258,11 +555,11 @@ class ChatView:
 			return
 
 		fileBrowser = FileBrowseWindow(self.W['main'],
-				self.gui.winLock, self.keys,
+				None, self.keys,
 				"Select file to send ...")
 		filepath = fileBrowser.select_file()
 
-		self.redraw(True)
+		self.gui.redraw(True)
 
 		if filepath:
 			t = SendFileThread(self.gui,
@@ -305,7 +602,7 @@ class ChatView:
 
 		dia = DialogWindow(
 			self.gui.stdscr,
-			self.gui.winLock,
+			None,
 			self.gui.keys,
 			"Delete message?",
 			"Do you really want to delete this "\
@@ -315,7 +612,9 @@ class ChatView:
 		self.wMsg.changed = True
 
 		if res == "yes":
-			self.msgStore.delete_msg(self.friend, msg['id'])
+			if msg.get('id') is not None:
+				self.msgStore.delete_msg(self.friend,
+						msg['id'])
 			self.wMsg.delete_selected()
 			self.gui.log_msg("Deleted message")
 
@@ -332,13 +631,13 @@ class ChatView:
 	def __help(self):
 		# Open help window
 		path = path_join(self.gui.uiconf.helpdir, "chat.txt")
-		help = TextWindow(self.gui.stdscr, self.gui.winLock,
+		help = TextWindow(self.gui.stdscr, None,
 				self.keys, title="Chat Help")
 		if not help.read_textfile(path):
 			self.gui.log_msg("Failed to open helpfile '"\
 				+path+"'", error=True)
 		else:
 			help.show()
-			self.redraw(True)
+			self.gui.redraw(True)
 
 		curses.curs_set(True)
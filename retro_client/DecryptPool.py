@@ -0,0 +1,153 @@
+import logging
+import threading
+import queue
+import time
+
+LOG = logging.getLogger(__name__)
+
+"""\
+Worker pool for decrypting incoming chat/file messages.
+
+Decrypting a message (RSA-OAEP, HMAC, Ed25519) is expensive,
+so the receive thread hands the packets over to this pool and
+goes on reading from the socket.
+
+Every worker has its own queue. Packets are distributed by
+the sender's userid (first 8 bytes of the payload), so all
+messages of one friend are decrypted and delivered by the
+same worker, in the order they were received.
+
+The throughput (see msgs_per_sec()) only counts the time the
+pool has packets to work on, idle gaps between bursts aren't
+included.
+
+"""
+
+class DecryptPool:
+
+	def __init__(self, msgHandler, on_decrypted, on_error,
+			num_workers=2):
+		"""\
+		Args:
+		  msgHandler:   libretro.MsgHandler
+		  on_decrypted: Called with (pckt, friend, msg) after
+				a packet was decrypted
+		  on_error:     Called with (pckt, error_string) if
+				decrypting a packet failed
+		  num_workers:  Number of worker threads
+		"""
+		self.msgHandler   = msgHandler
+		self.on_decrypted = on_decrypted
+		self.on_error     = on_error
+		self.num_workers  = max(1, num_workers)
+
+		self.queues  = [queue.Queue() for i in range(self.num_workers)]
+		self.workers = [threading.Thread(target=self.__work,
+					args=(q,), daemon=True)
+				for q in self.queues]
+
+		# Stats
+		self.lock         = threading.Lock()
+		self.num_msgs     = 0	# Number of decrypted messages
+		self.num_queued   = 0	# Submitted, not delivered yet
+		self.active_time  = 0	# Seconds with packets queued
+		self.active_since = 0	# Start of current active period
+
+
+	def start(self):
+		"""\
+		Start all worker threads.
+		"""
+		for w in self.workers:
+			w.start()
+
+
+	def submit(self, pckt):
+		"""\
+		Queue packet (T_CHATMSG|T_FILEMSG) for decryption.
+		"""
+		with self.lock:
+			if self.num_queued == 0:
+				self.active_since = time.perf_counter()
+			self.num_queued += 1
+		i = hash(pckt[1][:8]) % self.num_workers
+		self.queues[i].put(pckt)
+
+
+	def join(self):
+		"""\
+		Block until all queued packets are delivered.
+		"""
+		for q in self.queues:
+			q.join()
+
+
+	def stop(self):
+		"""\
+		Deliver all queued packets and stop the workers.
+		"""
+		for q in self.queues:
+			q.put(None)
+		for w in self.workers:
+			w.join()
+
+		LOG.debug("DecryptPool: {} workers, {} msgs, "\
+			"{:.1f} msgs/sec".format(self.num_workers,
+			self.num_msgs, self.msgs_per_sec()))
+
+
+	def msgs_per_sec(self):
+		"""\
+		Get the decryption throughput in messages per
+		second, measured over the periods the pool had
+		packets queued.
+		"""
+		with self.lock:
+			active = self.active_time
+			if self.num_queued:
+				active += time.perf_counter()-self.active_since
+			if self.num_msgs == 0 or active <= 0:
+				return 0.0
+			return self.num_msgs / active
+
+
+	def __work(self, q):
+		"""\
+		Worker thread, decrypts and delivers all packets
+		of the given queue.
+		"""
+		while True:
+			pckt = q.get()
+			if pckt is None:
+				q.task_done()
+				break
+
+			try:
+				friend,msg = self.msgHandler.decrypt_msg(
+						pckt[0], pckt[1])
+				with self.lock:
+					self.num_msgs += 1
+			except Exception as e:
+				self.on_error(pckt, str(e))
+				self.__done(q)
+				continue
+
+			try:
+				self.on_decrypted(pckt, friend, msg)
+			except Exception as e:
+				LOG.error("DecryptPool: "+str(e))
+			finally:
+				self.__done(q)
+
+
+	def __done(self, q):
+		"""\
+		Mark packet of given queue as done and end the
+		active period if nothing is queued anymore.
+		"""
+		with self.lock:
+			self.num_queued -= 1
+			if self.num_queued == 0:
+				self.active_time += time.perf_counter()-\
+						self.active_since
+		q.task_done()
@@ -1,5 +1,6 @@
 import plyer
 import threading
+import wave
 from plyer import notification
 from os.path import join as path_join
 
@@ -66,6 +67,24 @@ class EventNotifier:
 			timeout=30)
 		self.__play_sound(self.ON_RECV_FILEMSG)
 
+	def on_recv_backlog(self, counts):
+		"""\
+		Called after receiving all messages queued while
+		we were offline. This shows one notification per
+		friend and plays the message sound only once.
+		Args:
+		  counts: List with [friend, num_msgs, num_files]
+		"""
+		for friend,nmsgs,nfiles in counts:
+			body = []
+			if nmsgs: body.append("{} messages".format(nmsgs))
+			if nfiles: body.append("{} files".format(nfiles))
+			self.__notify(self.ON_RECV_MSG,
+				title="Got messages from "+friend.name,
+				body=", ".join(body), timeout=8)
+		if counts:
+			self.__play_sound(self.ON_RECV_MSG)
+
 	def on_friend_status_changed(self, friend, status):
 		event = self.ON_FRIEND_ONLINE if status=="online"\
 				else self.ON_FRIEND_OFFLINE
@@ -106,7 +125,7 @@ class EventNotifier:
 			try:
 				ev_name = self.EV_NAMES[event]
 				sndpath = path_join(self.snd_dir, ev_name+".wav")
-				t = PlayAudioThread(self.gui.pyaudio, sndpath)
+				t = PlayAudioThread(self.gui, sndpath)
 				t.start()
 			except Exception as e:
 				self.gui.error("play_sound: "+str(e))
@@ -116,34 +135,43 @@ class PlayAudioThread(threading.Thread):
 	"""\
 	Wav sound play thread.
 
-	This thread opens a soundfile and plays it.
+	This thread opens a soundfile and plays it. Errors are
+	posted to the main loop, which shows them.
 	"""
-	def __init__(self, pyAudio, filepath):
+	def __init__(self, gui, filepath):
 		"""\
 		Args:
-		  pyAudio:  pyaudio instance
+		  gui:      RetroGui instance
 		  filepath: Path to wav file
 		"""
 		super().__init__()
-		self.pyaudio  = pyAudio
+		self.gui      = gui
+		self.pyaudio  = gui.pyaudio
 		self.filepath = filepath
+		self.done     = False	# Stop playing?
 
 
 	def run(self):
-		wf = wave.open(self.filepath, 'rb')
-		stream = self.pyaudio.open(
-			format=self.pyaudio.get_format_from_width(
-				wf.getsampwidth()),
-			channels=wf.getnchannels(),
-			rate=wf.getframerate(),
-			output=True)
-
-		data = wf.readframes(2048)
-		while not self.done and data != b'':
-			stream.write(data)
-			data = wf.readframes(2048)
-
-		wf.close()
-		stream.stop_stream()
-		stream.close()
+		try:
+			self.__play()
+		except Exception as e:
+			self.gui.post(self.gui.error, "play_sound: "+str(e))
+
+
+	def __play(self):
+		with wave.open(self.filepath, 'rb') as wf:
+			stream = self.pyaudio.open(
+				format=self.pyaudio.get_format_from_width(
+					wf.getsampwidth()),
+				channels=wf.getnchannels(),
+				rate=wf.getframerate(),
+				output=True)
+			try:
+				data = wf.readframes(2048)
+				while not self.done and data != b'':
+					stream.write(data)
+					data = wf.readframes(2048)
+			finally:
+				stream.stop_stream()
+				stream.close()
 
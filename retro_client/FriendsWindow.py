@@ -69,7 +69,8 @@ class FriendsWindow:
 		"""\
 		Handle the keyevents 'UP' and 'DOWN' and
 		select the previous or next friend within
-		the friend list.
+		the friend list. The selected conversation
+		is prefetched (see ChatCache).
 		"""
 		if self.cy == None:
 			return
@@ -79,11 +80,13 @@ class FriendsWindow:
 				self.cy -= 1
 				self.__adjust_view()
 				self.changed = True
+				self.gui.chatCache.prefetch(self.get_selected())
 		elif ch == self.gui.keys['DOWN']:
 			if self.cy < len(self.friends)-1:
 				self.cy += 1
 				self.__adjust_view()
 				self.changed = True
+				self.gui.chatCache.prefetch(self.get_selected())
 
 
 	def redraw(self, force_redraw=False):
@@ -93,6 +96,7 @@ class FriendsWindow:
 
 		if not self.changed and not force_redraw:
 			return
+		self.changed = False
 
 		# We sort friends by 'status' to have first the online
 		# and then the offline friends.
@@ -100,25 +104,18 @@ class FriendsWindow:
 		self.friends = list(self.gui.cli.account.friends.values())
 		self.friends.sort(key=lambda x: x.status, reverse=False)
 
-		self.gui.winLock.acquire()
+		h,w = self.W.getmaxyx()
+		self.W.erase()
 		try:
-			h,w = self.W.getmaxyx()
-			self.W.clear()
-			try:
-				self.W.addstr(1, 1, " Friends" + " "*(w-2-8),
-					self.gui.colors['Wb']|curses.A_BOLD)
-
-				self.__print_friendlist(h, w, 2)
-				self.W.border()
-			except:
-				# Screen too small
-				pass
-			self.W.refresh()
-
-		finally:
-			self.gui.winLock.release()
-
-		self.changed = False
+			self.W.addstr(1, 1, " Friends" + " "*(w-2-8),
+				self.gui.colors['Wb']|curses.A_BOLD)
+
+			self.__print_friendlist(h, w, 2)
+			self.W.border()
+		except:
+			# Screen too small
+			pass
+		self.W.noutrefresh()
 
 
 	def __print_friendlist(self, h, w, y):
@@ -0,0 +1,185 @@
+import logging
+import socket
+import struct
+
+from collections import deque
+
+LOG = logging.getLogger(__name__)
+
+"""\
+Heartbeat of the server connection.
+
+Round trip time:
+  Once a second the kernel's RTT estimate of the connection is
+  read (TCP_INFO, Linux only). It's only recorded if the kernel
+  updated it since the last read, an idle connection (or acked
+  keepalive probes) would just repeat the same stale value. The
+  current value and the 95th percentile of the last 300 samples
+  are shown in the top window.
+  This is network latency only, so slow drawing or a busy client
+  doesn't show up here.
+
+Dead connections:
+  TCP keepalive probes are sent if the connection is idle, and
+  TCP_USER_TIMEOUT limits how long sent data may stay unacked.
+  If the server doesn't answer within dead_timeout seconds, the
+  kernel fails the connection, the receive thread notices and
+  the client reconnects. As a fallback (no TCP_USER_TIMEOUT) the
+  heartbeat checks TCP_INFO for unacked data itself.
+
+"""
+
+class Heartbeat:
+
+	INTERVAL    = 1.0	# Seconds between RTT samples
+	NUM_SAMPLES = 300	# Samples used for percentile
+
+	# struct tcp_info (linux/tcp.h), we only need the
+	# first fields: 8 x u8, then u32 values.
+	TCP_INFO     = struct.Struct('8B17I')
+	I_UNACKED    = 8+4	# tcpi_unacked
+	I_LAST_ACK   = 8+12	# tcpi_last_ack_recv (ms)
+	I_RTT        = 8+15	# tcpi_rtt (us)
+
+	def __init__(self, gui, dead_timeout=30):
+		"""\
+		Args:
+		  gui:          RetroGui instance
+		  dead_timeout: Seconds after an unresponsive
+				connection is closed
+		"""
+		self.gui          = gui
+		self.dead_timeout = dead_timeout
+		self.sock         = None
+		self.gen          = 0	# Invalidates scheduled samples
+		self.samples      = deque(maxlen=self.NUM_SAMPLES)
+		self.rtt          = None	# Current RTT (ms)
+		self.rtt_us       = None	# Last read tcpi_rtt (us)
+
+
+	def start(self, sock):
+		"""\
+		Configure keepalive of given socket and start
+		sampling the RTT (main thread).
+
+		Args:
+		  sock: Socket of the server connection
+		"""
+		self.stop()
+		self.sock = sock
+		if not sock:
+			return
+		self.__set_keepalive(sock)
+		if hasattr(socket, 'TCP_INFO'):
+			self.__sample(self.gen)
+
+
+	def stop(self):
+		"""\
+		Stop sampling.
+		"""
+		self.gen   += 1
+		self.sock   = None
+		self.rtt    = None
+		self.rtt_us = None
+		self.samples.clear()
+
+
+	def p95(self):
+		"""\
+		Get 95th percentile of the sampled RTTs (ms)
+		or None if no samples.
+		"""
+		if not self.samples:
+			return None
+		s = sorted(self.samples)
+		return s[min(len(s)-1, int(len(s)*0.95))]
+
+
+	def status_str(self):
+		"""\
+		Get string showing current and p95 RTT or an empty
+		string if unknown (used for the top window).
+		"""
+		if self.rtt is None:
+			return ""
+		return "{:.0f}ms (p95 {:.0f}ms)".format(self.rtt, self.p95())
+
+
+	# --- PRIVATE ------------------------------------------
+
+	def __set_keepalive(self, sock):
+		"""\
+		Enable TCP keepalive so a dead server is detected
+		within dead_timeout seconds.
+		"""
+		# Start probing after 1/4 of the timeout, then
+		# send 3 probes every 1/4 of the timeout.
+		intvl = max(1, int(self.dead_timeout/4))
+		opts  = [
+			(socket.SOL_SOCKET, 'SO_KEEPALIVE', 1),
+			(socket.IPPROTO_TCP, 'TCP_KEEPIDLE', intvl),
+			(socket.IPPROTO_TCP, 'TCP_KEEPINTVL', intvl),
+			(socket.IPPROTO_TCP, 'TCP_KEEPCNT', 3),
+			(socket.IPPROTO_TCP, 'TCP_USER_TIMEOUT',
+				int(self.dead_timeout*1000))
+		]
+		for level,name,val in opts:
+			if not hasattr(socket, name):
+				continue
+			try:
+				sock.setsockopt(level, getattr(socket, name), val)
+			except OSError as e:
+				LOG.debug("Heartbeat: {} failed, {}".format(
+					name, e))
+
+
+	def __sample(self, gen):
+		"""\
+		Read RTT of the connection and check if it's dead.
+		Called every INTERVAL seconds by the main loop.
+		The RTT is only recorded if it changed, which means
+		the kernel measured it again (new ACK of our data).
+		"""
+		if gen != self.gen or not self.gui.connected:
+			return
+		try:
+			buf  = self.sock.getsockopt(socket.IPPROTO_TCP,
+				socket.TCP_INFO, self.TCP_INFO.size)
+			info = self.TCP_INFO.unpack(
+				buf.ljust(self.TCP_INFO.size, b'\0'))
+		except (OSError, struct.error) as e:
+			LOG.debug("Heartbeat: "+str(e))
+			return
+
+		rtt_us = info[self.I_RTT]
+		if rtt_us > 0 and rtt_us != self.rtt_us:
+			rtt = rtt_us/1000
+			if self.rtt is None or round(rtt) != round(self.rtt):
+				self.gui.request_redraw()
+			self.rtt    = rtt
+			self.rtt_us = rtt_us
+			self.samples.append(rtt)
+
+		if info[self.I_UNACKED] and\
+		   info[self.I_LAST_ACK] > self.dead_timeout*1000:
+			# Server doesn't acknowledge our data
+			self.gui.error("Server doesn't respond for {}s, "\
+				"closing connection".format(
+				self.dead_timeout))
+			self.__shutdown()
+			return
+
+		self.gui.call_later(self.INTERVAL, self.__sample, gen)
+
+
+	def __shutdown(self):
+		"""\
+		Shut down the connection, the receive thread then
+		closes it and the client reconnects.
+		"""
+		try:
+			self.sock.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+		self.stop()
@@ -0,0 +1,66 @@
+from bisect import bisect_left
+
+"""\
+Latency statistics.
+
+Counts timed events (handler calls, keystrokes, page fetches,
+...) and keeps their total and max duration and a histogram, so
+the average, max and an upper bound of the 95th percentile can
+be logged without storing every sample.
+
+Example:
+	stats = LatencyStats()
+	stats.add(0.0012)
+	LOG.debug("{} calls, {}".format(stats.count, stats.summary()))
+
+"""
+
+class LatencyStats:
+
+	# Upper bounds (milliseconds) of the histogram buckets,
+	# the last bucket holds everything above.
+	BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+	def __init__(self):
+		self.count   = 0	# Number of events
+		self.total   = 0	# Total duration (sec)
+		self.max     = 0	# Max duration (sec)
+		self.buckets = [0]*(len(self.BUCKETS_MS)+1)
+
+
+	def add(self, sec):
+		"""\
+		Add an event which took 'sec' seconds.
+		"""
+		self.count += 1
+		self.total += sec
+		if sec > self.max:
+			self.max = sec
+		self.buckets[bisect_left(self.BUCKETS_MS, sec*1000)] += 1
+
+
+	def percentile(self, p):
+		"""\
+		Get (upper bound of) the p-th percentile in
+		milliseconds or None if above the last bucket.
+		"""
+		n = 0
+		for i,cnt in enumerate(self.buckets):
+			n += cnt
+			if n >= self.count*p/100:
+				if i < len(self.BUCKETS_MS):
+					return self.BUCKETS_MS[i]
+				return None
+		return 0
+
+
+	def summary(self):
+		"""\
+		Get string with average, 95th percentile and max
+		duration, like "avg 1.20ms, p95 <=5ms, max 7.31ms".
+		"""
+		p95 = self.percentile(95)
+		return "avg {:.2f}ms, p95 {}, max {:.2f}ms".format(
+			self.total*1000/max(1, self.count),
+			"<={}ms".format(p95) if p95 is not None else ">1s",
+			self.max*1000)
@@ -20,7 +20,10 @@ class MainView:
 		self.cy      = 0	# Cursor y position
 		self.changed = True
 
-		# List with tuples (date,text,attr)
+		# List with tuples (date,message,attr)
+		self.msgs = []
+
+		# Wrapped messages, list with tuples (date,text,attr)
 		self.lines = []
 
 		# Textwrapper for log messages
@@ -49,17 +52,14 @@ class MainView:
 		if level in attrs:
 			attr = attrs[level]
 
-		lines = self.tW.wrap(msg)
 		st = time.strftime("%H:%M:%S")
-
-		for i,line in enumerate(lines):
-			if i>0: st=None
-			self.lines.append((
-				st, line, attr))
-		self.changed = True
+		self.msgs.append((st, msg, attr))
+		self.__wrap(st, msg, attr)
 
 		if not self.gui.chatView and redraw:
-			self.redraw()
+			self.gui.request_redraw(self)
+		else:
+			self.changed = True
 
 		LOG.log(level, msg)
 
@@ -83,26 +83,44 @@ class MainView:
 
 		if not self.changed and not force_redraw:
 			return
+		self.changed = False
 
-		with self.gui.winLock:
-			h,w = self.W.getmaxyx()
+		h,w = self.W.getmaxyx()
+		if max(1, w-12) != self.tW.width:
+			self.__rewrap(w-12)
 
-			# Draw the logo and welcome message always
-			# on top of window, before the scroll text.
-			self.__print_logo(h, w)
+		# Draw the logo and welcome message always
+		# on top of window, before the scroll text.
+		self.__print_logo(h, w)
 
-			# Draw the scroll text (self.lines).
-			y    = 9
-			boxh = h-y-1
+		# Draw the scroll text (self.lines).
+		y    = 9
+		boxh = h-y-1
+
+		for boxy,line in enumerate(self.lines[self.cy:]):
+			if boxy >= boxh: break
+			self.__print_line(y, line)
+			y += 1
+
+		self.W.border()
+		self.W.noutrefresh()
+
+
+	def __wrap(self, st, msg, attr):
+		# Wrap log message and append its lines
+		for i,line in enumerate(self.tW.wrap(msg)):
+			if i>0: st=None
+			self.lines.append((
+				st, line, attr))
 
-			for boxy,line in enumerate(self.lines[self.cy:]):
-				if boxy >= boxh: break
-				self.__print_line(y, line)
-				y += 1
 
-			self.W.border()
-			self.W.refresh()
-			self.changed = False
+	def __rewrap(self, width):
+		# Rewrap all log messages to given width (resized)
+		self.tW.width = max(1, width)
+		self.lines    = []
+		for st,msg,attr in self.msgs:
+			self.__wrap(st, msg, attr)
+		self.cy = min(self.cy, max(0, len(self.lines)-1))
 
 
 	def __print_line(self, y, line):
@@ -119,7 +137,7 @@ class MainView:
 	def __print_logo(self, h, w):
 		# Print the logo, welcome message and command help.
 		# Args: window height/width
-		self.W.clear()
+		self.W.erase()
 		self.W.addstr(1, 2, "___ ___ ___ ___ ____",self.gui.colors['b']|curses.A_BOLD)
 		self.W.addstr(2, 2, "|_/ |_   |  |_/ |  |",self.gui.colors['b']|curses.A_BOLD)
 		self.W.addstr(3, 2, "| \\ |___ |  | \\ |__|", self.gui.colors['b']|curses.A_BOLD)
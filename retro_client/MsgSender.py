@@ -0,0 +1,186 @@
+import logging
+import threading
+import queue
+import time
+
+from . LatencyStats import LatencyStats
+
+LOG = logging.getLogger(__name__)
+
+"""\
+Sender thread for outgoing chat messages.
+
+The chatview only encrypts a message and queues it here, so a
+slow TLS write never blocks the input loop. The message is shown
+right away (optimistically) with state 'pending' and updated to
+sent or failed as soon as the sender knows.
+
+Messages which can't be sent (not connected, write failed) are
+moved to the outbox and sent after reconnecting. The outbox is
+flushed by the sender as well, so all outgoing messages are
+passed to the packet writer by this thread and keep their order.
+
+The queue is bounded. If it's full, send() blocks until there
+is space again (back pressure).
+
+"""
+
+class MsgSender(threading.Thread):
+
+	# Message states
+	PENDING = 'pending'	# Queued, not sent yet
+	SENT    = 'sent'	# Written to the connection
+	FAILED  = 'failed'	# Failed, waits in outbox
+
+	# Queue marker, flush outbox
+	FLUSH_OUTBOX = 'outbox'
+
+	def __init__(self, gui, max_queued=256):
+		"""\
+		Args:
+		  gui:        RetroGui instance
+		  max_queued: Max number of queued messages
+		"""
+		super().__init__(daemon=True)
+
+		self.gui    = gui
+		self.queue  = queue.Queue(max_queued)
+		self.states = {}	# id(msg) -> (msg, state)
+		self.lock   = threading.Lock()
+
+		# Stats: Latency from send() until the message
+		# was written to the connection.
+		self.stats = LatencyStats()
+
+
+	def send(self, msg, pckt_type, data):
+		"""\
+		Queue message for sending.
+
+		Args:
+		  msg:       Message dict (shown in chat window)
+		  pckt_type: Packet type (Proto.T_*)
+		  data:      Packet payload (encrypted message)
+		"""
+		self.__set_state(msg, self.PENDING)
+		self.queue.put((time.perf_counter(), msg, pckt_type, data))
+
+
+	def flush_outbox(self):
+		"""\
+		Send all messages queued in the outbox.
+		"""
+		self.queue.put(self.FLUSH_OUTBOX)
+
+
+	def get_state(self, msg):
+		"""\
+		Get state of given message.
+
+		Return:
+		  PENDING, FAILED or None if sent (or received)
+		"""
+		with self.lock:
+			item = self.states.get(id(msg))
+		return item[1] if item else None
+
+
+	def close(self):
+		"""\
+		Handle all queued messages and stop the sender.
+		"""
+		self.queue.put(None)
+		if self.is_alive():
+			self.join()
+
+		LOG.debug("MsgSender: {} msgs, enqueue to wire {}"\
+			.format(self.stats.count, self.stats.summary()))
+
+
+	def run(self):
+		while True:
+			item = self.queue.get()
+			if item is None:
+				break
+			elif item == self.FLUSH_OUTBOX:
+				self.__flush_outbox()
+			else:
+				self.__send(*item)
+
+
+	# --- PRIVATE ------------------------------------------
+
+	def __send(self, t, msg, pckt_type, data):
+		"""\
+		Send message or move it to the outbox.
+		"""
+		if not self.gui.connected:
+			# Keep pending until sent from outbox
+			self.gui.outbox.add(pckt_type, data, msg)
+			return
+
+		# Messages sent in quick succession are coalesced
+		# by the packet writer, so don't wait here.
+		fut = self.gui.packetWriter.send(pckt_type, data)
+		fut.add_done_callback(lambda f: self.__written(f, t,
+				msg, pckt_type, data))
+
+
+	def __written(self, fut, t, msg, pckt_type, data):
+		"""\
+		Called by the packet writer if the message was
+		written or writing failed.
+		"""
+		err = fut.exception()
+		if err:
+			LOG.error("MsgSender: "+str(err))
+			self.gui.error("Failed to send message, "\
+				"sending it after reconnecting")
+			self.gui.outbox.add(pckt_type, data, msg)
+			self.__set_state(msg, self.FAILED)
+			return
+
+		self.stats.add(time.perf_counter()-t)
+		self.__set_state(msg, self.SENT)
+
+
+	def __flush_outbox(self):
+		"""\
+		Send all messages of the outbox.
+		"""
+		n = self.gui.outbox.flush(self.__sent)
+		if n:
+			self.gui.info("Sent {} queued message(s)".format(n))
+
+
+	def __sent(self, msgs):
+		"""\
+		Called by the outbox with the messages sent.
+		"""
+		for msg in msgs:
+			self.__set_state(msg, self.SENT)
+
+
+	def __set_state(self, msg, state):
+		"""\
+		Set message state and update the chat window.
+		Sent messages aren't tracked anymore.
+		"""
+		with self.lock:
+			if state == self.SENT:
+				if not self.states.pop(id(msg), None):
+					return
+			else:
+				self.states[id(msg)] = (msg, state)
+
+		if state != self.PENDING:
+			self.gui.post(self.__update_view)
+
+
+	def __update_view(self):
+		"""\
+		Redraw chat window (main thread).
+		"""
+		cV = self.gui.chatView
+		if cV:
+			self.gui.request_redraw(cV.wMsg)
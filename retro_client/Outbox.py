@@ -0,0 +1,162 @@
+import logging
+import threading
+import struct
+import time
+import os
+
+
+LOG = logging.getLogger(__name__)
+
+"""\
+Persistent outbox for messages composed while offline.
+
+Messages are encrypted (msgHandler.make_msg()) and stored to the
+message store right away, only sending is deferred. The encrypted
+packets are appended to the outbox file, so they survive a
+restart of the client:
+
+  ~/.retro/accounts/<user>/outbox
+
+Record format: type (uint16), length (uint32), data (little endian)
+
+After (re)connecting, the sender thread (see MsgSender) flushes
+all queued packets as one pipelined burst through the packet
+writer, so thousands of messages need only a few large TLS
+writes. Afterwards the file is truncated. If the client dies
+while flushing, packets may be sent twice but never get lost.
+
+"""
+
+class Outbox:
+
+	HEADER = struct.Struct('<HI')
+
+	def __init__(self, gui, path):
+		"""\
+		Args:
+		  gui:  RetroGui instance
+		  path: Path to outbox file
+		"""
+		self.gui  = gui
+		self.path = path
+		self.lock = threading.Lock()
+		self.msgs = []	# Queued message dicts (this session)
+
+		# Drop a record left incomplete by a crash, so
+		# new records are appended after the last valid one.
+		pckts,end = self.__read()
+		if os.path.exists(path) and os.path.getsize(path) > end:
+			LOG.warning("Outbox: Dropped incomplete record")
+			os.truncate(path, end)
+
+
+	def add(self, pckt_type, data, msg=None):
+		"""\
+		Append packet to outbox.
+
+		Args:
+		  pckt_type: Packet type (Proto.T_*)
+		  data:      Packet payload (encrypted message)
+		  msg:       Message dict, passed to flush()'s
+			     on_sent callback
+		"""
+		with self.lock:
+			if msg is not None:
+				self.msgs.append(msg)
+			with open(self.path, 'ab') as f:
+				f.write(self.HEADER.pack(pckt_type, len(data)))
+				f.write(data)
+				f.flush()
+				os.fsync(f.fileno())
+
+
+	def count(self):
+		"""\
+		Get number of queued packets.
+		"""
+		with self.lock:
+			return len(self.__read()[0])
+
+
+	def flush(self, on_sent=None):
+		"""\
+		Send all queued packets and remove them from the
+		outbox. Must be called while connected.
+		NOTE: The outbox isn't locked while sending, since
+		      failed packets are added meanwhile.
+
+		Args:
+		  on_sent: Called with list of message dicts
+			   (see add()) after sending
+		Return:
+		  Number of sent packets
+		"""
+		with self.lock:
+			pckts,end = self.__read()
+			nmsgs     = len(self.msgs)
+		if not pckts:
+			return 0
+
+		t    = time.time()
+		futs = [self.gui.packetWriter.send(pckt_type, data)
+				for pckt_type,data in pckts]
+		try:
+			for fut in futs:
+				fut.result()
+		except Exception as e:
+			# Keep outbox, everything is sent again
+			# after reconnecting.
+			LOG.error("Outbox: "+str(e))
+			return 0
+
+		with self.lock:
+			# Remove sent packets, keep those added
+			# while sending.
+			with open(self.path, 'rb') as f:
+				f.seek(end)
+				rest = f.read()
+			tmp = self.path+'.tmp'
+			with open(tmp, 'wb') as f:
+				f.write(rest)
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(tmp, self.path)
+			msgs = self.msgs[:nmsgs]
+			del self.msgs[:nmsgs]
+
+		if on_sent:
+			on_sent(msgs)
+
+		LOG.debug("Outbox: Sent {} packets in {:.1f}ms".format(
+			len(pckts), (time.time()-t)*1000))
+		return len(pckts)
+
+
+	# --- PRIVATE ------------------------------------------
+
+	def __read(self):
+		"""\
+		Read all packets from outbox file.
+
+		Return:
+		  Tuple (list of tuples (type, data), end of
+		  last complete record)
+		"""
+		try:
+			with open(self.path, 'rb') as f:
+				buf = f.read()
+		except FileNotFoundError:
+			return [],0
+
+		pckts = []
+		pos   = 0
+		while pos+self.HEADER.size <= len(buf):
+			pckt_type,n = self.HEADER.unpack_from(buf, pos)
+			pos += self.HEADER.size
+			if pos+n > len(buf):
+				# Incomplete record (crashed while writing)
+				pos -= self.HEADER.size
+				break
+			pckts.append((pckt_type, buf[pos:pos+n]))
+			pos += n
+		return pckts,pos
@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+
+from . LatencyStats import LatencyStats
+
+LOG = logging.getLogger(__name__)
+
+"""\
+Table driven dispatcher for incoming packets.
+
+Handlers are registered per packet type (Proto.T_*). The receive
+thread passes every packet to dispatch(), which calls the handler
+registered for the packet's type. Components (and plugins) can
+add handlers without touching the receive loop.
+
+For every packet type, the dispatcher counts the packets and
+keeps a latency histogram of the handler calls, so we can see
+which packet types take the most time of the receive thread.
+
+"""
+
+class PacketStats(LatencyStats):
+	"""\
+	Counter and handler latency histogram of a packet type.
+	"""
+	def __init__(self):
+		super().__init__()
+		self.errors = 0		# Number of failed handler calls
+
+	def add(self, sec, failed=False):
+		"""\
+		Add a handler call which took 'sec' seconds.
+		"""
+		super().add(sec)
+		if failed:
+			self.errors += 1
+
+
+class PacketDispatcher:
+
+	def __init__(self):
+		self.handlers = {}	# Packet type -> handler
+		self.default  = None	# Handler for unknown types
+		self.stats    = {}	# Packet type -> PacketStats
+		self.lock     = threading.Lock()
+
+
+	def register(self, pckt_type, handler):
+		"""\
+		Register handler for given packet type. An already
+		registered handler will be replaced.
+
+		Args:
+		  pckt_type: Packet type (Proto.T_*)
+		  handler:   Function called with the packet
+		"""
+		with self.lock:
+			self.handlers[pckt_type] = handler
+
+
+	def unregister(self, pckt_type):
+		"""\
+		Remove handler of given packet type.
+		"""
+		with self.lock:
+			self.handlers.pop(pckt_type, None)
+
+
+	def set_default(self, handler):
+		"""\
+		Set handler called for packet types without
+		registered handler.
+		"""
+		self.default = handler
+
+
+	def dispatch(self, pckt):
+		"""\
+		Call the handler registered for the packet's type.
+
+		Args:
+		  pckt: Packet tuple (type, data)
+		Return:
+		  False if no handler found or handler failed
+		"""
+		handler = self.handlers.get(pckt[0], self.default)
+		if not handler:
+			LOG.warning("PacketDispatcher: No handler "\
+				"for packet type "+str(pckt[0]))
+			return False
+
+		ok = True
+		t  = time.perf_counter()
+		try:
+			handler(pckt)
+		except Exception as e:
+			LOG.error("PacketDispatcher: Handler of type "\
+				"{} failed, {}".format(pckt[0], e))
+			ok = False
+
+		sec = time.perf_counter()-t
+		with self.lock:
+			if pckt[0] not in self.stats:
+				self.stats[pckt[0]] = PacketStats()
+			self.stats[pckt[0]].add(sec, not ok)
+		return ok
+
+
+	def get_stats(self):
+		"""\
+		Get dictionary with packet type as key and
+		PacketStats as value.
+		"""
+		with self.lock:
+			return dict(self.stats)
+
+
+	def stats_lines(self):
+		"""\
+		Get the stats as list of printable lines, sorted
+		by total handler time.
+		"""
+		lines = []
+		stats = sorted(self.get_stats().items(),
+				key=lambda x: x[1].total,
+				reverse=True)
+		for pckt_type,st in stats:
+			lines.append("type {}: {} pckts, {} errors, "\
+				"total {:.1f}ms, {}".format(pckt_type,
+				st.count, st.errors, st.total*1000,
+				st.summary()))
+		return lines
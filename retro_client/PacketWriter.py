@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import Future
+
+from . netutil import get_socket, CorkedSocket
+
+LOG = logging.getLogger(__name__)
+
+"""\
+Write coalescing for outgoing packets.
+
+All packets sent to the server go through the packet writer.
+send() only queues a packet, the writer thread collects all
+packets queued within a short window (or until max_batch is
+reached) and writes them through a corked socket (see netutil).
+Packets of an outbox flush, the friend subscription or a
+message sent to several friends become one buffered TLS write
+instead of one write per packet.
+
+Every send() returns a Future resolving to True as soon as the
+packet was written or failing with the write error.
+
+"""
+
+class PacketWriter(threading.Thread):
+
+	def __init__(self, cli, window=0.001, max_batch=256):
+		"""\
+		Args:
+		  cli:       RetroClient instance
+		  window:    Seconds to wait for more packets
+		  max_batch: Max number of packets per write
+		"""
+		super().__init__(daemon=True)
+
+		self.cli       = cli
+		self.window    = window
+		self.max_batch = max_batch
+		self.queue     = deque()	# Queued (type, data, fut)
+		self.cond      = threading.Condition()
+		self.done      = False
+
+		# Stats
+		self.num_pckts   = 0	# Number of written packets
+		self.num_batches = 0	# Number of batches
+		self.num_writes  = 0	# Number of sendall() calls
+		self.num_bytes   = 0	# Number of bytes written
+		self.write_time  = 0	# Seconds spent writing
+
+
+	def send(self, pckt_type, data=None):
+		"""\
+		Queue packet for writing.
+
+		Args:
+		  pckt_type: Packet type (Proto.T_*)
+		  data:      Packet payload or None
+		Return:
+		  Future resolving to True if written
+		"""
+		fut = Future()
+		with self.cond:
+			self.queue.append((pckt_type, data, fut))
+			if len(self.queue) == 1:
+				self.cond.notify()
+		return fut
+
+
+	def close(self):
+		"""\
+		Write all queued packets and stop the writer.
+		"""
+		with self.cond:
+			self.done = True
+			self.cond.notify()
+		if self.is_alive():
+			self.join()
+
+		LOG.debug("PacketWriter: {} pckts in {} batches, {} "\
+			"writes ({:.2f} per pckt), {:.0f} pckts/s".format(
+			self.num_pckts, self.num_batches, self.num_writes,
+			self.num_writes/max(1, self.num_pckts),
+			self.num_pckts/max(self.write_time, 1e-6)))
+
+
+	def run(self):
+		while True:
+			batch = self.__get_batch()
+			if not batch:
+				break
+			self.__write(batch)
+
+
+	# --- PRIVATE ------------------------------------------
+
+	def __get_batch(self):
+		"""\
+		Wait for queued packets. If there are less than
+		max_batch, wait up to the window for more.
+
+		Return:
+		  List of queued packets, empty if closed
+		"""
+		with self.cond:
+			while not self.queue and not self.done:
+				self.cond.wait()
+
+			deadline = time.time() + self.window
+			while len(self.queue) < self.max_batch and\
+					not self.done:
+				timeout = deadline - time.time()
+				if timeout <= 0:
+					break
+				self.cond.wait(timeout)
+
+			n = min(len(self.queue), self.max_batch)
+			return [self.queue.popleft() for i in range(n)]
+
+
+	def __write(self, batch):
+		"""\
+		Write a batch of packets with a single buffered
+		write (if it doesn't exceed the cork's buffer).
+		"""
+		sock = get_socket(self.cli)
+		if not sock:
+			err = ConnectionError("Not connected")
+			for _,_,fut in batch:
+				fut.set_exception(err)
+			return
+
+		t    = time.time()
+		cork = CorkedSocket(sock)
+		ends = []	# Stream position after every packet
+		try:
+			with cork:
+				for pckt_type,data,_ in batch:
+					if data is None:
+						self.cli.send_packet(pckt_type)
+					else:	self.cli.send_packet(pckt_type, data)
+					ends.append(cork.position())
+		except Exception as e:
+			LOG.error("PacketWriter: "+str(e))
+			# Packets written before the error are sent,
+			# only fail the others (they are sent again).
+			for i,(_,_,fut) in enumerate(batch):
+				if i < len(ends) and ends[i] <= cork.num_bytes:
+					fut.set_result(True)
+				else:	fut.set_exception(e)
+			return
+
+		self.write_time  += time.time()-t
+		self.num_pckts   += len(batch)
+		self.num_batches += 1
+		self.num_writes  += cork.num_writes
+		self.num_bytes   += cork.num_bytes
+
+		for _,_,fut in batch:
+			fut.set_result(True)
@@ -0,0 +1,221 @@
+import logging
+import threading
+import random
+import time
+
+from . netutil import get_socket, get_ssl_context
+
+LOG = logging.getLogger(__name__)
+
+"""\
+Reconnect supervisor.
+
+If the connection to the retro server gets lost, the supervisor
+reconnects automatically. Attempts are scheduled with jittered
+exponential backoff ('full jitter': a random delay between zero
+and min(max_delay, min_delay*2^n)), so a restarting server isn't
+hit by all clients at the same time.
+
+The TCP/TLS connect runs in a short-lived worker thread, so the
+user interface keeps responding. The result is posted back to
+the main thread, which then re-establishes the session (see
+RetroGui.start_session()).
+
+To make the TLS handshake cheaper, the session of the last
+connection is offered to the server again (session resumption).
+libretro doesn't expose this, so the TLS context's wrap_socket()
+is wrapped to pass the saved session.
+
+"""
+
+class Reconnector:
+
+	def __init__(self, gui, min_delay=1, max_delay=60):
+		"""\
+		Args:
+		  gui:       RetroGui instance
+		  min_delay: Max delay (sec) before the first attempt
+		  max_delay: Upper bound of the backoff delay (sec)
+		"""
+		self.gui       = gui
+		self.cli       = gui.cli
+		self.min_delay = min_delay
+		self.max_delay = max_delay
+
+		self.attempts   = 0	# Failed attempts since lost
+		self.lost_time  = 0	# Time the connection got lost
+		self.gen        = 0	# Invalidates scheduled attempts
+		self.running    = False	# Reconnect in progress?
+		self.connecting = False	# Connect attempt running?
+		self.session    = None	# TLS session of last connection
+		self.ctx        = None	# Patched TLS context
+
+		# Stats
+		self.num_reconnects = 0	# Successful reconnects
+		self.num_resumed    = 0	# ... with resumed TLS session
+
+
+	def connection_lost(self):
+		"""\
+		Called (by the main thread) if the connection got
+		lost without the user asking for it. This starts
+		reconnecting.
+		"""
+		if self.running:
+			return
+		self.running   = True
+		self.attempts  = 0
+		self.lost_time = time.time()
+		self.__schedule()
+
+
+	def connect_now(self):
+		"""\
+		Skip the backoff delay and attempt to connect right
+		now (user pressed reconnect).
+		"""
+		if self.connecting:
+			return
+		self.gen += 1
+		self.__attempt(self.gen)
+
+
+	def cancel(self):
+		"""\
+		Cancel reconnecting (quitting).
+		"""
+		self.gen    += 1
+		self.running = False
+
+
+	def save_session(self, sock):
+		"""\
+		Remember the TLS session of given socket, so it can be
+		resumed when reconnecting. Must be called before the
+		socket is closed.
+		"""
+		try:
+			if sock and sock.session:
+				self.session = sock.session
+		except Exception as e:
+			LOG.debug("Reconnector: No TLS session, "+str(e))
+
+
+	def enable_resumption(self):
+		"""\
+		Wrap the TLS context's wrap_socket(), so the saved
+		session is offered to the server.
+		"""
+		ctx = get_ssl_context(self.cli)
+		if not ctx or ctx is self.ctx:
+			if not ctx:
+				LOG.debug("Reconnector: TLS context not "\
+					"found, no session resumption")
+			return
+
+		wrap_socket = ctx.wrap_socket
+
+		def wrap_with_session(sock, *args, **kwargs):
+			if self.session and 'session' not in kwargs:
+				try:
+					return wrap_socket(sock, *args,
+						session=self.session,
+						**kwargs)
+				except ValueError:
+					# Session doesn't fit the context
+					self.session = None
+			return wrap_socket(sock, *args, **kwargs)
+
+		ctx.wrap_socket = wrap_with_session
+		self.ctx = ctx
+
+
+	def log_stats(self):
+		"""\
+		Log number of reconnects.
+		"""
+		LOG.debug("Reconnector: {} reconnects, {} with resumed "\
+			"TLS session".format(self.num_reconnects,
+			self.num_resumed))
+
+
+	# --- PRIVATE ------------------------------------------
+
+	def __schedule(self):
+		"""\
+		Schedule next attempt with jittered exponential
+		backoff.
+		"""
+		limit = min(self.max_delay, self.min_delay*2**self.attempts)
+		delay = random.uniform(0, limit)
+		self.gui.info("Reconnecting in {:.1f}s ...".format(delay))
+		self.gui.call_later(delay, self.__attempt, self.gen)
+
+
+	def __attempt(self, gen):
+		"""\
+		Start a connect attempt (main thread).
+		"""
+		if gen != self.gen:
+			return
+		if self.gui.connected:
+			# Old connection isn't closed yet
+			self.__schedule()
+			return
+		self.enable_resumption()
+		self.connecting = True
+		self.gui.info("Connecting to " +
+			self.cli.get_hoststr() + " ...")
+		threading.Thread(target=self.__connect, args=(gen,),
+				daemon=True).start()
+
+
+	def __connect(self, gen):
+		"""\
+		Connect to server (worker thread).
+		"""
+		try:
+			self.cli.connect()
+		except Exception as e:
+			self.gui.post(self.__failed, gen, str(e))
+			return
+		self.gui.post(self.__connected, gen)
+
+
+	def __failed(self, gen, err):
+		"""\
+		Connect attempt failed (main thread).
+		"""
+		self.connecting = False
+		if gen != self.gen:
+			return
+		self.attempts += 1
+		LOG.debug("Reconnector: Attempt {} failed, {}".format(
+			self.attempts, err))
+		self.__schedule()
+
+
+	def __connected(self, gen):
+		"""\
+		Connect attempt succeeded (main thread).
+		"""
+		self.connecting = False
+		if gen != self.gen:
+			# Cancelled meanwhile (quitting)
+			self.cli.close()
+			return
+
+		self.running = False
+		sock    = get_socket(self.cli)
+		resumed = bool(sock and sock.session_reused)
+		nbytes  = self.gui.start_session()
+
+		self.num_reconnects += 1
+		if resumed:
+			self.num_resumed += 1
+
+		LOG.debug("Reconnector: Reconnected after {:.2f}s, "\
+			"{} attempts, {} bytes sent, TLS session {}"\
+			.format(time.time()-self.lost_time,
+			self.attempts+1, nbytes,
+			"resumed" if resumed else "new"))
@@ -1,12 +1,17 @@
 import curses
 import logging
 import threading
-import select
+import selectors
+import socket
+import os
 import time
 
 from libretro.protocol import *
 from libretro.Friend import *
 
+from . netutil import get_socket
+from . DecryptPool import DecryptPool
+
 LOG = logging.getLogger(__name__)
 
 
@@ -14,7 +19,27 @@ class RecvThread(threading.Thread):
 	"""\
 	After connecting to the retro server, the receive thread is
 	started. It handles all incoming messages.
+
+	The thread sleeps in a selector waiting on the TLS socket
+	and a wakeup pipe. Packets are handled as soon as the socket
+	gets readable and calling stop() wakes the selector up, so
+	the thread terminates right away.
+
+	After connecting, the server sends all messages queued while
+	we were offline. This backlog is ingested as a batch:
+	Notifications are shown once per friend and the sidebar is
+	repainted once.
+	The backlog is over if nothing is received for a moment.
+
+	In single threaded mode (ui.conf: single_thread) the thread
+	isn't started. Instead start_polled() is called and the main
+	loop waits on the socket together with the terminal input,
+	calling poll() whenever the socket gets readable.
 	"""
+
+	BACKLOG_QUIET_SEC = 0.5	# Backlog is over after this idle time
+	BACKLOG_MAX_SEC   = 30	# Max duration of backlog mode
+
 	def __init__(self, gui):
 		super().__init__()
 
@@ -24,7 +49,44 @@ class RecvThread(threading.Thread):
 		self.msgStore     = gui.cli.msgStore
 		self.recv_timeout = gui.conf.recv_timeout
 		self.done         = False
+		self.closed       = False
+		self.polled       = False	# Single threaded mode?
 		self.start_time   = 0
+		self.last_recv    = 0	# Time of last received packet
+
+		self.sock     = None	# TLS socket (see netutil)
+		self.selector = None	# Waits on socket and wakeup pipe
+
+		# Writing to the wakeup pipe interrupts the selector
+		self.wakeup_r,self.wakeup_w = os.pipe()
+
+		# Incoming chat/file messages are decrypted by a worker
+		# pool. If no workers are configured, messages are
+		# decrypted right here in the receive thread.
+		self.decryptPool = None
+		if gui.uiconf.decrypt_workers > 0 and\
+				not gui.uiconf.single_thread:
+			self.decryptPool = DecryptPool(self.msgHandler,
+					self.__deliver_msg,
+					self.__decrypt_failed,
+					gui.uiconf.decrypt_workers)
+
+		# Backlog mode (see class description)
+		self.backlog       = True
+		self.backlog_lock  = threading.Lock()
+		self.backlog_count = {}	# friend.name -> [friend,nmsgs,nfiles]
+
+		# Pool workers store their messages one at a time
+		self.store_lock = threading.Lock()
+
+		# Register handlers for all packet types we deal with
+		self.dispatcher = gui.dispatcher
+		self.__register_handlers()
+
+		# Stats
+		self.wakeups   = 0	# Number of selector wakeups
+		self.stop_time = 0	# Time stop() was called
+		self.shutdown_latency = 0 # Seconds from stop() to exit
 
 		# Sometimes the receive thread needs information
 		# - about how do deal with some packet types -
@@ -60,92 +122,364 @@ class RecvThread(threading.Thread):
 		return self.info.pop(key)
 
 
+	def __register_handlers(self):
+		"""\
+		Register the receive thread's packet handlers at
+		the dispatcher.
+		"""
+		d = self.dispatcher
+
+		# Chat/File message
+		d.register(Proto.T_CHATMSG, self.__handle_chat_msg)
+		d.register(Proto.T_FILEMSG, self.__handle_chat_msg)
+
+		# Friend status (online/offline/..)
+		d.register(Proto.T_FRIEND_ONLINE, self.__set_friend_status)
+		d.register(Proto.T_FRIEND_OFFLINE, self.__set_friend_status)
+		d.register(Proto.T_FRIEND_UNKNOWN, self.__set_friend_status)
+
+		# Incoming public key (add new friend)
+		d.register(Proto.T_PUBKEY, self.__add_friend)
+
+		# Server error message
+		d.register(Proto.T_ERROR, self.__handle_server_error)
+
+		# Invalid msg type
+		d.set_default(self.__handle_invalid)
+
+
+	def stop(self):
+		"""\
+		Stop the receive thread. This wakes up the selector,
+		so the thread terminates immediately.
+		Call recvThread.join() afterwards.
+		In single threaded mode, the receiver is closed
+		right away.
+		"""
+		self.done = True
+		self.stop_time = time.time()
+		if self.polled:
+			self.__close()
+			return
+
+		if self.wakeup_w is not None:
+			try:
+				os.write(self.wakeup_w, b'\0')
+			except OSError:
+				pass
+
+		# TLS protocol data (e.g. TLS 1.3 session tickets)
+		# makes the socket readable without a packet, so
+		# the thread may wait in recv_packet(). Shutting
+		# down the reading side makes it return right away.
+		# SSLSocket.shutdown() would drop the TLS state,
+		# which is still used for saving the session.
+		if self.sock:
+			try:
+				socket.socket.shutdown(self.sock,
+						socket.SHUT_RD)
+			except OSError:
+				pass
+
+
 	def run(self):
 		"""\
 		Run the receive thread.
-		To stop the thread set recvThread.done=True
-		and call recvThread.join().
+		To stop the thread call recvThread.stop()
+		and recvThread.join().
 		"""
-		self.start_time = time.time()
+		if self.__open():
+			self.selector = selectors.DefaultSelector()
+			self.selector.register(self.sock,
+				selectors.EVENT_READ)
+			self.selector.register(self.wakeup_r,
+				selectors.EVENT_READ)
 
 		while not self.done:
 
+			# Data might already be buffered inside the
+			# TLS layer, so only wait if nothing is pending.
+			if not self.sock.pending():
+				events = self.selector.select(
+						self.__backlog_timeout())
+				self.wakeups += 1
+				if self.done: break
+
+				if not events:
+					# Nothing received for a while
+					self.__end_backlog()
+					continue
+
+			if not self.handle_readable():
+				break
+
+		self.__close()
+
+
+	def start_polled(self):
+		"""\
+		Single threaded mode: Prepare receiving without
+		starting the thread. The main loop has to wait on
+		self.sock (and for timeout()) and call poll().
+
+		Return:
+		  False if not connected
+		"""
+		self.polled = True
+		if not self.__open():
+			self.__close()
+			return False
+		return True
+
+
+	def timeout(self):
+		"""\
+		Single threaded mode: Get seconds until poll()
+		must be called even if the socket isn't readable,
+		None if there is no such deadline.
+		"""
+		if self.closed:
+			return None
+		if self.sock.pending():
+			return 0
+		return self.__backlog_timeout()
+
+
+	def poll(self, readable):
+		"""\
+		Single threaded mode: Called by the main loop if the
+		socket got readable or the timeout() exceeded.
+
+		Args:
+		  readable: Did the socket get readable?
+		Return:
+		  False if the connection got closed, else True
+		"""
+		if self.closed:
+			return False
+		self.wakeups += 1
+
+		if self.__backlog_timeout() == 0:
+			# Nothing received for a while
+			self.__end_backlog()
+
+		if not readable and not self.sock.pending():
+			return True
+
+		if not self.handle_readable():
+			self.__close()
+			return False
+		return True
+
+
+	def handle_readable(self):
+		"""\
+		Receive and handle all packets available at the
+		socket (including those buffered by the TLS layer).
+
+		Return:
+		  False if the connection got closed, else True
+		"""
+		while True:
 			try:
-				# Wait for incoming messages. If pckt is
-				# None, receive timeout exceeded.
+				# The socket is readable, so the packet
+				# should arrive immediately. recv_timeout
+				# only bounds the wait for partial packets.
 				pckt = self.cli.recv_packet(
 					timeout_sec=self.recv_timeout)
 			except Exception as e:
-				self.gui.error(str(e))
-				break
+				if not self.done:
+					self.gui.error(str(e))
+				return False
 
 			if pckt == False:
-				continue
+				return True
 			elif not pckt:
-				break
-			elif pckt[0] == Proto.T_CHATMSG or\
-			   pckt[0] == Proto.T_FILEMSG:
-				# Chat/File message
-				self.__handle_chat_msg(pckt)
-
-			elif pckt[0] in (Proto.T_FRIEND_ONLINE,
-					 Proto.T_FRIEND_OFFLINE,
-					 Proto.T_FRIEND_UNKNOWN):
-				# Friend status (online/offline/..)
-				self.__set_friend_status(pckt)
-
-			elif pckt[0] == Proto.T_PUBKEY:
-				# Incoming public key (add new friend)
-				self.__add_friend(pckt)
-
-			elif pckt[0] == Proto.T_ERROR:
-				# Server error message
-				self.gui.error("Server: {}"\
-					.format(pckt[1].decode()))
-			else:
-				# Invalid msg type
-				self.gui.error("RecvThread: "\
-					"Got invalid msgtype "\
-					"("+str(pckt[1])+")")
-
-		# We are not connected anymore, update status.
-		self.gui.error("Server closed connection")
+				return False
+
+			self.last_recv = time.time()
+			self.dispatcher.dispatch(pckt)
+
+			if not self.sock.pending():
+				return True
+
+
+	def __handle_server_error(self, pckt):
+		"""\
+		Handle error message (T_ERROR) sent by the server.
+		"""
+		self.gui.error("Server: {}".format(pckt[1].decode()))
+
+
+	def __handle_invalid(self, pckt):
+		"""\
+		Called for packets without registered handler.
+		"""
+		self.gui.error("RecvThread: Got invalid msgtype "\
+			"("+str(pckt[0])+")")
+
+
+	def __backlog_timeout(self):
+		"""\
+		Get the selector timeout. In backlog mode this is
+		the idle time ending the backlog, else None.
+		"""
+		if not self.backlog:
+			return None
+		deadline = min(self.last_recv+self.BACKLOG_QUIET_SEC,
+				self.start_time+self.BACKLOG_MAX_SEC)
+		return max(0, deadline-time.time())
+
+
+	def __open(self):
+		"""\
+		Prepare receiving, called before entering the
+		receive loop.
+
+		Return:
+		  False if not connected
+		"""
+		self.start_time = self.last_recv = time.time()
+
+		if self.decryptPool:
+			self.decryptPool.start()
+
+		self.sock = get_socket(self.cli)
+		if not self.sock:
+			self.gui.error("RecvThread: No connection")
+			self.done = True
+			return False
+		return True
+
+
+	def __end_backlog(self):
+		"""\
+		Finish backlog mode. This shows the aggregated
+		notifications and repaints the sidebar.
+		"""
+		if not self.backlog:
+			return
+
+		# Wait until all backlog messages are delivered
+		if self.decryptPool:
+			self.decryptPool.join()
+
+		self.backlog = False
+
+		with self.backlog_lock:
+			counts = list(self.backlog_count.values())
+			self.backlog_count = {}
+
+		if counts:
+			n = sum(c[1]+c[2] for c in counts)
+			LOG.debug("RecvThread: Ingested backlog of {} "\
+				"msgs in {:.2f}s".format(n,
+				time.time()-self.start_time))
+			self.gui.evNotifier.on_recv_backlog(counts)
+
+		self.gui.request_redraw(self.gui.sidebar)
+
+
+	def __close(self):
+		"""\
+		Called after leaving the receive loop. We are not
+		connected anymore, so update the status.
+		"""
+		if self.closed:
+			return
+		self.closed = True
+		self.__end_backlog()
+
+		if self.stop_time:
+			self.shutdown_latency = time.time()-self.stop_time
+
+		LOG.debug("RecvThread: {} wakeups in {:.1f}s, "\
+			"shutdown took {:.1f}ms".format(self.wakeups,
+			time.time()-self.start_time,
+			self.shutdown_latency*1000))
+
+		if self.decryptPool:
+			self.decryptPool.stop()
+
+		if self.selector:
+			self.selector.close()
+		os.close(self.wakeup_r)
+		os.close(self.wakeup_w)
+		self.wakeup_r = self.wakeup_w = None
+
 		self.gui.connected = False
+		self.gui.reconnector.save_session(self.sock)
 		self.cli.close()
-		self.gui.redraw()
+
+		if not self.stop_time:
+			# Connection was closed by the server,
+			# reconnect automatically. Posted after
+			# closing, so the reconnector doesn't see
+			# the old connection.
+			self.gui.error("Server closed connection")
+			self.gui.post(self.gui.reconnector.connection_lost)
+
+		self.gui.request_redraw()
 
 
 	def __handle_chat_msg(self, pckt):
 		"""\
 		Called after message type 'message' or 'file-message'
-		received. This will decrypt the message, store it into
-		the message database and refresh the ui.
+		received. This will decrypt the message (or pass it
+		to the decrypt pool) and deliver it.
 		"""
 		if not pckt[1]:
 			LOG.error("handle_chat_msg: No payload!")
 			return False
 
+		if self.decryptPool:
+			self.decryptPool.submit(pckt)
+			return True
+
 		try:
 			friend,msg = self.msgHandler.decrypt_msg(pckt[0],pckt[1])
 		except Exception as e:
-			self.gui.error("MsgHandler: "+str(e))
+			self.__decrypt_failed(pckt, str(e))
 			return False
 
+		self.__deliver_msg(pckt, friend, msg)
+		return True
+
+
+	def __decrypt_failed(self, pckt, err):
+		"""\
+		Called if decrypting a chat/file message failed.
+		"""
+		self.gui.error("MsgHandler: "+err)
+
+
+	def __deliver_msg(self, pckt, friend, msg):
+		"""\
+		Called with every decrypted chat/file message. This
+		stores the message into the message database and
+		refreshes the ui.
+		NOTE: If the decrypt pool is enabled, this is called
+		      from the pool's worker threads.
+		"""
 		# Store message to sqlite db. Set unseen=1.
 		msg['unseen'] = 1
-		msg['id'] = self.msgStore.add_msg(friend, msg)
+		with self.store_lock:
+			msg['id'] = self.msgStore.add_msg(friend, msg)
 		friend.unseen_msgs += 1
 
-		if self.gui.chatView:
-			# If user is currently chatting with sender,
-			# update the chatmessage view.
-			cV = self.gui.chatView
-			if cV.friend and cV.friend.name == friend.name:
-				cV.add_msg(msg)
-		else:
-			# We are in mainview, update the sidebar
-			self.gui.sidebar.changed = True
-			self.gui.sidebar.redraw()
+		# Update the user interface within main thread
+		self.gui.post(self.__show_msg, friend, msg)
+
+		if self.backlog:
+			# Notifications are shown after the backlog
+			# was received completely.
+			with self.backlog_lock:
+				cnt = self.backlog_count.setdefault(
+					friend.name, [friend, 0, 0])
+				if pckt[0] == Proto.T_FILEMSG:
+					cnt[2] += 1
+				else:	cnt[1] += 1
+			return
 
 		# Execute message receive event
 		if pckt[0] == Proto.T_CHATMSG:
@@ -155,6 +489,20 @@ class RecvThread(threading.Thread):
 				friend, msg['filename'], msg['size'])
 
 
+	def __show_msg(self, friend, msg):
+		"""\
+		Show received message. This is posted to and
+		executed by the main thread.
+		"""
+		# Update the conversation with the sender, if
+		# opened or cached.
+		self.gui.chatCache.add_msg(friend, msg)
+
+		if not self.gui.chatView and not self.backlog:
+			# We are in mainview, update the sidebar
+			self.gui.request_redraw(self.gui.sidebar)
+
+
 	def __set_friend_status(self, pckt):
 		"""\
 		Handle received 'friend-status' message and set
@@ -201,8 +549,8 @@ class RecvThread(threading.Thread):
 
 
 		# If we're in mainview, redraw the sidebar
-		if not self.gui.chatView:
-			self.gui.sidebar.redraw()
+		if not self.gui.chatView and not self.backlog:
+			self.gui.request_redraw(self.gui.sidebar)
 
 
 	def __add_friend(self, pckt):
@@ -238,11 +586,13 @@ class RecvThread(threading.Thread):
 			LOG.error("__add_friend: "+str(e))
 			return
 
-		# Update user interface
-		self.gui.sidebar.reset_friends()
+		# Subscribe to new friend's status and
+		# update user interface
+		self.gui.post(self.gui.subscribe_friends)
+		self.gui.post(self.gui.sidebar.reset_friends)
 		self.gui.info("You have a new friend ({})"\
 			.format(username))
-		self.gui.redraw(force=True)
+		self.gui.request_redraw(force=True)
 
 
 	def __get_friend_from_msg(self, pckt):
@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+"""\
+Frame rate limited render scheduler.
+
+Instead of redrawing the screen on every event, the views that
+changed are marked as dirty. The main loop then runs a render
+pass (RetroGui.redraw()), but at most max_fps times per second.
+Under message floods this caps the curses work per frame and
+not per packet, since all changes made within one frame are
+coalesced into one render pass.
+
+The render pass uses noutrefresh() for all windows followed
+by a single curses.doupdate(). The views erase() their windows
+before drawing instead of clear(), which would make curses
+repaint the whole terminal. So doupdate() compares the new frame
+with the screen row by row and writes the changed cells only.
+
+The dirty flag is cleared when a render pass starts and views
+reset their 'changed' flag before drawing. So changes made by
+other threads during a render pass schedule another frame.
+
+NOTE: Only the main thread renders, mark_dirty() may be
+      called from any thread.
+
+"""
+
+class RenderScheduler:
+
+	def __init__(self, gui, max_fps=20):
+		"""\
+		Args:
+		  gui:     RetroGui instance
+		  max_fps: Max number of render passes per second
+		"""
+		self.gui       = gui
+		self.interval  = 1.0/max(1, max_fps)
+		self.lock      = threading.Lock()
+		self.dirty     = False
+		self.last_time = 0	# Time of last render pass
+
+		# Stats
+		self.num_requests = 0	# Number of redraw requests
+		self.num_frames   = 0	# Number of render passes
+
+
+	def mark_dirty(self, view=None):
+		"""\
+		Mark view as changed and schedule a render pass.
+		This wakes up the main loop.
+
+		Args:
+		  view: View instance (with attribute 'changed')
+			or None to only schedule a render pass
+		"""
+		if view:
+			view.changed = True
+		with self.lock:
+			self.num_requests += 1
+			was_dirty  = self.dirty
+			self.dirty = True
+		if not was_dirty:
+			self.gui.wakeup()
+
+
+	def rendering(self):
+		"""\
+		Tell the scheduler that a render pass starts.
+		Views marked dirty from now on are drawn with
+		the next frame.
+		"""
+		with self.lock:
+			self.dirty = False
+
+
+	def rendered(self):
+		"""\
+		Tell the scheduler that the screen was rendered.
+		"""
+		self.last_time = time.time()
+		self.num_frames += 1
+
+
+	def timeout(self):
+		"""\
+		Get seconds until the next render pass is due or
+		None if nothing is dirty.
+		"""
+		if not self.dirty:
+			return None
+		return max(0, self.last_time+self.interval-time.time())
+
+
+	def render_if_due(self):
+		"""\
+		Run a render pass if something is dirty and the
+		frame interval is over.
+		"""
+		if self.timeout() == 0:
+			self.gui.redraw()
+
+
+	def close(self):
+		"""\
+		Log stats.
+		"""
+		LOG.debug("RenderScheduler: {} redraw requests, "\
+			"{} frames".format(self.num_requests,
+			self.num_frames))
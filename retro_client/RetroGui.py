@@ -9,6 +9,14 @@ import curses
 import threading
 import logging
 import pyaudio
+import queue
+import select
+import signal
+import heapq
+import itertools
+import os
+import sys
+import time
 
 from time    import sleep    as time_sleep
 from os      import listdir  as os_listdir
@@ -30,7 +38,17 @@ from . UiConfig        import UiConfig
 from . FriendsWindow   import FriendsWindow
 from . MainView        import MainView
 from . ChatView        import *
+from . ChatCache       import ChatCache
 from . RecvThread      import RecvThread
+from . Reconnector     import Reconnector
+from . Outbox          import Outbox
+from . MsgSender       import MsgSender
+from . PacketWriter    import PacketWriter
+from . Heartbeat       import Heartbeat
+from . netutil         import get_socket
+from . PacketDispatcher import PacketDispatcher
+from . LatencyStats    import LatencyStats
+from . RenderScheduler import RenderScheduler
 #from . AudioPlayer     import AudioPlayer
 from . EventNotifier   import EventNotifier
 from . SettingsWindow  import SettingsWindow
@@ -77,11 +95,17 @@ class RetroGui:
 		self.userid     = ""		# User ID
 		self.connected  = False		# Are we connected ?
 		self.recvThread = None		# Receive thread
+		self.outbox     = None		# Messages composed offline
+		self.msgSender  = None		# Sends outgoing messages
+		self.packetWriter = PacketWriter(self.cli) # Outgoing packets
+		self.heartbeat  = None		# Connection RTT/keepalive
+		self.dispatcher = PacketDispatcher() # Incoming packets
+		self.reconnector = Reconnector(self) # Auto reconnect
+		self.subscribed = set()		# Friend ids sent to server
 
 		self.uiconf   = UiConfig(self.conf) # UI Configs
 		self.stdscr   = None		# Curses std screen
 		self.W        = {}		# All curses windows
-		self.winLock  = threading.Lock() # Window lock
 		self.colors   = {} 		# Ui colors
 		self.keys     = Keyboard()	# Keyboard keys/shortcuts
 		self.pyaudio  = pyaudio.PyAudio() # Pyaudio interface
@@ -89,6 +113,31 @@ class RetroGui:
 		self.sidebar  = None	# Sidebar
 		self.mainView = None	# Mainview
 		self.chatView = None	# Chatview
+		self.chatCache = ChatCache(self) # Recently opened chats
+		self.renderer = None	# Render scheduler
+
+		self.logmsg         = None # Log window text (text,is_error)
+		self.logwin_changed = True # Must redraw log window?
+
+		# Only the main thread touches curses. Other threads
+		# post their events (functions) to this queue, which
+		# is handled by the main loop (see wait_key()).
+		self.events   = queue.Queue()
+		self.timers   = []		# Heap (time,n,func,args)
+		self.timer_n  = itertools.count()
+		self.resized  = False		# Got SIGWINCH?
+
+		# Stats: Latency from keystroke to screen update and
+		# cpu time, to compare threaded and single threaded
+		# mode (ui.conf: single_thread).
+		self.keyStats  = LatencyStats()
+		self.key_time  = None	# Time of last unpainted key
+		self.ctrl_keys = set()	# Shortcuts, not measured
+
+		# Writing to the wakeup pipe wakes up the main loop
+		self.wakeup_r,self.wakeup_w = os.pipe()
+		os.set_blocking(self.wakeup_r, False)
+		os.set_blocking(self.wakeup_w, False)
 
 #		self.audioPlayer = AudioPlayer(self)	# Audio player
 		self.evNotifier  = EventNotifier(self)	# Event notifier
@@ -117,12 +166,25 @@ class RetroGui:
 			self.username = self.cli.account.name
 			self.userid   = self.cli.account.id
 
+			# Messages written while offline are sent
+			# after (re)connecting.
+			self.outbox = Outbox(self, path_join(
+				self.conf.basedir, 'accounts',
+				self.username, 'outbox'))
+			self.msgSender = MsgSender(self)
+
 			# Load UI settings
 			self.uiconf.load()
+			self.renderer = RenderScheduler(self,
+					self.uiconf.max_fps)
+			self.heartbeat = Heartbeat(self,
+					self.uiconf.dead_timeout)
 
 			# Load keyboard keys and shortcuts
 			kbpath = self.uiconf.res_path('keyboard.json')
 			self.keys.load_config(kbpath)
+			self.ctrl_keys = {v for k,v in self.keys.keys.items()
+					if k.startswith('CTRL_')}
 			#self.audioPlayer.load_sound_files()
 			return True
 
@@ -137,15 +199,19 @@ class RetroGui:
 		"""
 		# Setup everything
 		self.__setup()
+		start_time = time.time()
+		start_cpu  = time.process_time()
 
 		self.redraw(resize=True)
+		self.packetWriter.start()
+		self.msgSender.start()
 		UnseenMsgCounter(self).start()
 		self.__connect()
 
 		while True:
 
 			try:
-				ch = self.sidebar.getch()
+				ch = self.wait_key(self.sidebar)
 			except KeyboardInterrupt:
 				break
 
@@ -202,14 +268,30 @@ class RetroGui:
 
 
 		# Quitting ...
+		self.reconnector.cancel()
+		self.msgSender.close()
 		if self.connected:
-			self.cli.send_packet(Proto.T_GOODBYE)
+			try:
+				self.packetWriter.send(Proto.T_GOODBYE)\
+					.result(timeout=2)
+			except Exception as e:
+				LOG.error("Goodbye: "+str(e))
 
 			self.info("Waiting for recv thread to finish ...")
 			if self.recvThread:
-				self.cli.close()
-				self.recvThread.done = True
-				self.recvThread.join()
+				self.recvThread.stop()
+				if not self.recvThread.polled:
+					self.recvThread.join()
+
+		self.packetWriter.close()
+		self.renderer.close()
+
+		for line in self.dispatcher.stats_lines():
+			LOG.debug("Packets: "+line)
+		self.reconnector.log_stats()
+		self.chatCache.log_stats()
+		self.__log_ui_stats(time.time()-start_time,
+				time.process_time()-start_cpu)
 
 		curses.endwin()
 		self.pyaudio.terminate()
@@ -226,34 +308,193 @@ class RetroGui:
 			  windows to changed before drawing.
 		  resize: Resize the view before drawing?
 		"""
+		self.renderer.rendering()
+
 		if resize:
 			self.resize()
 
+		if force:
+			# Views only erase their windows, so curses
+			# sends the changed cells only. Repaint the
+			# whole terminal if forced (e.g. closed popup).
+			self.stdscr.clearok(True)
+			self.stdscr.noutrefresh()
+
 		self.print_topwin()
 
+		if self.logwin_changed or force:
+			self.__print_logwin()
+
 		if self.chatView:
 			self.chatView.redraw(force)
 		else:
 			self.sidebar.redraw(force)
 			self.mainView.redraw(force)
 
+		# All windows are refreshed with noutrefresh(),
+		# now update the physical screen at once.
+		curses.doupdate()
+		self.renderer.rendered()
+
+		if self.key_time is not None:
+			self.keyStats.add(time.perf_counter()-self.key_time)
+			self.key_time = None
+
+
+	def request_redraw(self, view=None, force=False):
+		"""\
+		Schedule a redraw of the screen. This may be called
+		from any thread, the render scheduler will redraw
+		everything that changed within the current frame.
+
+		Args:
+		  view:  View that changed (sidebar, mainView, ...)
+		  force: Set all views to changed?
+		"""
+		if force:
+			self.mainView.changed = True
+			self.sidebar.changed  = True
+			self.logwin_changed   = True
+			if self.chatView:
+				self.chatView.wMsg.changed = True
+		self.renderer.mark_dirty(view)
+
+
+	def is_ui_thread(self):
+		"""\
+		Are we running in the main (ui) thread?
+		"""
+		return threading.current_thread() is threading.main_thread()
+
+
+	def post(self, func, *args):
+		"""\
+		Run func(*args) within the main thread. This can be
+		called from any thread, the function is executed by
+		the main loop as soon as possible.
+		"""
+		self.events.put((func, args))
+		self.wakeup()
+
+
+	def call_later(self, sec, func, *args):
+		"""\
+		Run func(*args) within the main thread after the
+		given number of seconds.
+		"""
+		if not self.is_ui_thread():
+			self.post(self.call_later, sec, func, *args)
+			return
+		heapq.heappush(self.timers, (time.time()+sec,
+				next(self.timer_n), func, args))
+
+
+	def wakeup(self):
+		"""\
+		Wake up the main loop.
+		"""
+		try:
+			os.write(self.wakeup_w, b'\0')
+		except (BlockingIOError, OSError):
+			# Pipe is full, main loop will wake up anyway
+			pass
+
+
+	def process_events(self):
+		"""\
+		Handle all events posted by other threads and all
+		timers which are due.
+		"""
+		while True:
+			try:
+				func,args = self.events.get_nowait()
+			except queue.Empty:
+				break
+			try:
+				func(*args)
+			except Exception as e:
+				LOG.error("Event {}: {}".format(
+					func.__name__, e))
+
+		now = time.time()
+		while self.timers and self.timers[0][0] <= now:
+			_,_,func,args = heapq.heappop(self.timers)
+			try:
+				func(*args)
+			except Exception as e:
+				LOG.error("Timer {}: {}".format(
+					func.__name__, e))
+
+
+	def wait_key(self, view):
+		"""\
+		Wait until a key is pressed within the window of
+		given view (sidebar, ChatView.wIn, ...). While waiting,
+		all events posted by other threads are handled and
+		the screen is rendered if anything changed.
+		NOTE: Must be called by the main thread.
+
+		Args:
+		  view: View with getch() method and window at view.W
+		Return:
+		  Pressed key
+		"""
+		view.W.nodelay(True)
+		try:
+			while True:
+				ch = view.getch()
+				if ch != -1:
+					# Shortcuts may open modal windows,
+					# so they aren't measured.
+					if ch not in self.ctrl_keys:
+						self.key_time = time.perf_counter()
+					return ch
+
+				if self.resized:
+					# Terminal has been resized
+					self.resized = False
+					self.__resize_term()
+					return curses.KEY_RESIZE
+
+				self.process_events()
+				self.renderer.render_if_due()
+				self.__wait_input(self.__next_timeout())
+		finally:
+			view.W.nodelay(False)
+
 
 	def log_msg(self, text, error=False, show_sec=2):
 		"""\
-		Write message to self.W['log'].
+		Write message to self.W['log']. The message will
+		be cleared after show_sec seconds.
 		"""
-		log = LogMsgThread(self, text, error, show_sec)
-		log.start()
+		if not self.is_ui_thread():
+			self.post(self.log_msg, text, error, show_sec)
+			return
+		self.set_logmsg(text, error)
+		self.call_later(show_sec, self.__clear_logmsg,
+				self.logmsg)
+
+
+	def set_logmsg(self, text, error=False):
+		"""\
+		Set the text shown in the log window.
+		Args:
+		  text:  Message text or None to clear log window
+		  error: Show as error message?
+		"""
+		self.logmsg = (text,error) if text else None
+		self.logwin_changed = True
+		self.request_redraw()
 
 
 	def clear_win(self, win_name):
 		"""\
 		Clear and refresh window with given name.
 		"""
-		with self.winLock:
-			if win_name in self.W:
-				self.W[win_name].clear()
-				self.W[win_name].refresh()
+		if win_name in self.W:
+			self.W[win_name].clear()
+			self.W[win_name].refresh()
 
 
 	def print_topwin(self):
@@ -264,41 +505,60 @@ class RetroGui:
 		left   = "User: " + self.cli.account.name
 		center = RETRO_CLIENT_RELEASE
 		right  = "online" if self.connected else "offline"
+		rtt    = self.heartbeat.status_str() if self.connected\
+				else ""
 
-		with self.winLock:
-			win = self.W['top']
-			win.clear()
-			_,w = win.getmaxyx()
+		win = self.W['top']
+		win.erase()
+		_,w = win.getmaxyx()
 
-			try:
-				win.addstr(0, 1, left, curses.A_BOLD)
-				win.addstr(0, int(w/2-len(center)/2), center)
+		try:
+			win.addstr(0, 1, left, curses.A_BOLD)
+			win.addstr(0, int(w/2-len(center)/2), center)
 
-				if self.connected:
-					rcol = self.colors['gb']|curses.A_BOLD
-				else:	rcol = self.colors['rb']|curses.A_BOLD
+			if self.connected:
+				rcol = self.colors['gb']|curses.A_BOLD
+			else:	rcol = self.colors['rb']|curses.A_BOLD
 
-				win.addstr(0, w-len(right)-1, right, rcol)
-			except:
-				# Screen too small
-				pass
-			win.refresh()
+			win.addstr(0, w-len(right)-1, right, rcol)
+			if rtt:
+				win.addstr(0, w-len(right)-len(rtt)-2,
+					rtt, curses.A_DIM)
+		except:
+			# Screen too small
+			pass
+		win.noutrefresh()
 
 
+	# The following functions can be called from any thread,
+	# if not called by the main thread they are posted.
+
 	def info(self, text, redraw=True, on_logwin=False):
+		if not self.is_ui_thread():
+			self.post(self.info, text, redraw, on_logwin)
+			return
 		self.mainView.add_msg(logging.INFO, text, redraw)
 		if on_logwin and self.chatView:
 			self.log_msg(text, error=False)
 
 	def error(self, text, redraw=True, on_logwin=False):
+		if not self.is_ui_thread():
+			self.post(self.error, text, redraw, on_logwin)
+			return
 		self.mainView.add_msg(logging.ERROR, text, redraw)
 		if on_logwin and self.chatView:
 			self.log_msg(text, error=True)
 
 	def warn(self, text, redraw=True):
+		if not self.is_ui_thread():
+			self.post(self.warn, text, redraw)
+			return
 		self.mainView.add_msg(logging.WARNING, text, redraw)
 
 	def debug(self, text, redraw=True):
+		if not self.is_ui_thread():
+			self.post(self.debug, text, redraw)
+			return
 		self.mainView.add_msg(logging.DEBUG, text, redraw)
 
 
@@ -332,7 +592,6 @@ class RetroGui:
 			main2_h = 0
 			main2_y = 0
 
-		self.winLock.acquire()
 		try:
 			[win.clear() for win in self.W.values()]
 
@@ -357,8 +616,6 @@ class RetroGui:
 		except:
 			# Window too small...
 			pass
-		finally:
-			self.winLock.release()
 
 		self.set_view_changed()
 
@@ -376,6 +633,116 @@ class RetroGui:
 
 	#-- PRIVATE --------------------------------------------------
 
+	def __next_timeout(self):
+		"""\
+		Get seconds until the next render pass or timer is
+		due, None if nothing is scheduled.
+		"""
+		timeouts = [self.renderer.timeout()]
+		if self.timers:
+			timeouts.append(max(0, self.timers[0][0]-time.time()))
+		recv = self.__polled_recv()
+		if recv:
+			timeouts.append(recv.timeout())
+		timeouts = [t for t in timeouts if t is not None]
+		return min(timeouts) if timeouts else None
+
+
+	def __wait_input(self, timeout=None):
+		"""\
+		Wait until terminal input is available, the main loop
+		is woken up (see wakeup()) or timeout exceeded.
+		In single threaded mode, this also waits on the server
+		socket and handles all incoming packets.
+		"""
+		rfds = [sys.stdin, self.wakeup_r]
+		recv = self.__polled_recv()
+		if recv:
+			rfds.append(recv.sock)
+
+		rlist,_,_ = select.select(rfds, [], [], timeout)
+		if self.wakeup_r in rlist:
+			try:
+				while os.read(self.wakeup_r, 4096):
+					pass
+			except BlockingIOError:
+				pass
+
+		if recv and (recv.sock in rlist or recv.timeout() == 0):
+			recv.poll(recv.sock in rlist)
+
+
+	def __polled_recv(self):
+		"""\
+		Get the receiver if running in single threaded mode
+		and connected, else None.
+		"""
+		recv = self.recvThread
+		if recv and recv.polled and not recv.closed:
+			return recv
+		return None
+
+
+	def __log_ui_stats(self, wall_sec, cpu_sec):
+		"""\
+		Log keystroke to paint latency and cpu usage.
+		"""
+		LOG.debug("UI ({}): {} keys, keystroke to paint {}"\
+			.format("single threaded"\
+				if self.uiconf.single_thread\
+				else "threaded",
+			self.keyStats.count, self.keyStats.summary()))
+		LOG.debug("UI: cpu {:.2f}s in {:.1f}s ({:.1f}%)".format(
+			cpu_sec, wall_sec, cpu_sec*100/max(wall_sec, 1e-6)))
+
+
+	def __on_sigwinch(self, signum, frame):
+		"""\
+		Signal handler for SIGWINCH (terminal resized).
+		"""
+		self.resized = True
+		self.wakeup()
+
+
+	def __resize_term(self):
+		"""\
+		Resize curses to the current terminal size.
+		"""
+		cols,lines = os.get_terminal_size(sys.stdout.fileno())
+		curses.resizeterm(lines, cols)
+
+
+	def __clear_logmsg(self, logmsg):
+		"""\
+		Clear log window if it still shows given logmsg.
+		"""
+		if self.logmsg == logmsg:
+			self.set_logmsg(None)
+
+
+	def __print_logwin(self):
+		"""\
+		Draws the log window (see log_msg()).
+		"""
+		self.logwin_changed = False
+		win = self.W['log']
+		_,w = win.getmaxyx()
+
+		if self.logmsg and self.logmsg[1]:
+			win.bkgd(' ', self.colors['Wr'])
+		else:	win.bkgd(' ', self.colors['Wb'])
+		win.erase()
+
+		if self.logmsg:
+			try:
+				win.addstr(0, 1, self.logmsg[0][:w-2],
+					curses.A_BOLD)
+			except:
+				# Screen too small
+				pass
+		win.noutrefresh()
+
+
 	def __connect(self):
 		"""\
 		Connect to retro server.
@@ -383,33 +750,81 @@ class RetroGui:
 		if self.connected:
 			self.log_msg("You are already connected", error=True)
 			return
+		elif self.reconnector.running:
+			# Already reconnecting, skip the backoff delay
+			self.reconnector.connect_now()
+			return
 
 		self.info("Connecting to " +
 			self.cli.get_hoststr() + " ...")
 		try:
+			self.reconnector.enable_resumption()
 			self.cli.connect()
-			self.connected = True
-			self.info("We are connected :-)")
-			#self.debug("SSL: ".format(self.cli.conn.cipher()))
 		except Exception as e:
 			self.error(str(e))
-			self.connected = False
+			# Redraw topwin to see connection status
+			self.print_topwin()
+			return
+
+		self.start_session()
+
+
+	def start_session(self):
+		"""\
+		Called after the connection to the server has been
+		established. This subscribes to the friends' status
+		and starts the receive thread.
+
+		Return:
+		  Number of payload bytes sent
+		"""
+		self.connected = True
+		self.info("We are connected :-)")
+		#self.debug("SSL: ".format(self.cli.conn.cipher()))
 
 		# Redraw topwin to see connection status
 		self.print_topwin()
 
-		if self.connected:
+		# The server doesn't know anything about a new
+		# connection, so all friends are subscribed again.
+		self.subscribed = set()
+		nbytes = self.subscribe_friends()
 
-			# Send all friends to server to keep track of their
-			# status (online/offline)
-			friend_ids = list(self.cli.account.friends.keys())
-			if friend_ids:
-				self.cli.send_packet(Proto.T_FRIENDS,
-					b''.join(friend_ids))
+		# Send messages written while we were offline
+		self.msgSender.flush_outbox()
 
-			# Start receive thread
-			self.recvThread = RecvThread(self)
-			self.recvThread.start()
+		# Start receive thread. In single threaded mode
+		# the main loop polls the socket instead.
+		self.recvThread = RecvThread(self)
+		if self.uiconf.single_thread:
+			self.recvThread.start_polled()
+		else:	self.recvThread.start()
+
+		# Measure RTT and detect a dead connection
+		self.heartbeat.start(get_socket(self.cli))
+		return nbytes
+
+
+	def subscribe_friends(self):
+		"""\
+		Send all friends, which weren't sent yet within the
+		current connection, to the server to keep track of
+		their status (online/offline).
+
+		Return:
+		  Number of payload bytes sent
+		"""
+		if not self.connected:
+			return 0
+		friend_ids = [fid for fid in self.cli.account.friends.keys()
+				if fid not in self.subscribed]
+		if not friend_ids:
+			return 0
+
+		data = b''.join(friend_ids)
+		self.packetWriter.send(Proto.T_FRIENDS, data)
+		self.subscribed.update(friend_ids)
+		return len(data)
 
 
 	def __open_chat(self, friend):
@@ -420,9 +835,11 @@ class RetroGui:
 				.format(friend.name))
 			return
 
-		# Open and run chatview loop
-		self.chatView = ChatView(self)
-		if self.chatView.load_chat(friend):
+		# Open and run chatview loop, the key opening
+		# the chat isn't measured (see wait_key()).
+		self.key_time = None
+		self.chatView = self.chatCache.open(friend)
+		if self.chatView:
 			self.chatView.loop()
 		self.chatView = None
 
@@ -433,7 +850,7 @@ class RetroGui:
 	def __help(self):
 		# Open help window
 		path = path_join(self.uiconf.helpdir, "main.txt")
-		help = TextWindow(self.stdscr, self.winLock,
+		help = TextWindow(self.stdscr, None,
 				self.keys, title="Mainview Help")
 		if not help.read_textfile(path):
 			self.error("Failed to open helpfile '"+path+"'")
@@ -454,7 +871,7 @@ class RetroGui:
 
 		# Let user enter new friend's name
 		entryBox = EntryBoxWindow(self.stdscr,
-				self.winLock, self.keys,
+				None, self.keys,
 				"Enter name of friend")
 		username = entryBox.get_input()
 		self.set_view_changed()
@@ -463,7 +880,7 @@ class RetroGui:
 
 		# Let user enter new friend's userid
 		entryBox = EntryBoxWindow(self.stdscr,
-				self.winLock, self.keys,
+				None, self.keys,
 				"Enter userid of friend")
 		useridx = entryBox.get_input()
 		self.set_view_changed()
@@ -481,7 +898,7 @@ class RetroGui:
 		self.recvThread.add_info('friendname', username)
 
 		# Send T_GET_PUBKEY request
-		self.cli.send_packet(Proto.T_GET_PUBKEY, userid)
+		self.packetWriter.send(Proto.T_GET_PUBKEY, userid)
 
 
 	def __delete_friend(self):
@@ -492,7 +909,7 @@ class RetroGui:
 
 		# Let user confirm before deleting friend
 		dia = DialogWindow(self.stdscr,
-			self.winLock, self.keys,
+			None, self.keys,
 			"Delete friend {}?".format(friend.name),
 			"Delete your friend "+friend.name+" and "\
 			"all your conversations? This cannot be "\
@@ -502,6 +919,7 @@ class RetroGui:
 
 		if res == 'yes':
 			self.cli.account.delete_friend(friend.id)
+			self.chatCache.discard(friend)
 			self.sidebar.reset_friends()
 			self.info("Deleted your friend "+friend.name)
 			self.redraw(force=True)
@@ -514,6 +932,10 @@ class RetroGui:
 		"""
 		self.stdscr = curses.initscr()
 
+		# We handle resizing ourselves, so a resize also
+		# wakes up the main loop (see wait_key()).
+		signal.signal(signal.SIGWINCH, self.__on_sigwinch)
+
 		curses.curs_set(False)
 		curses.noecho()
 		curses.start_color()
@@ -609,48 +1031,4 @@ class UnseenMsgCounter(threading.Thread):
 		for fr in self.friends.keys():
 			n = self.gui.cli.msgStore.get_num_unseen(self.friends[fr])
 			self.friends[fr].unseen_msgs = n
-		self.gui.sidebar.changed = True
-		if not self.gui.chatView:
-			self.gui.sidebar.redraw()
-			self.gui.sidebar.changed = True
-
-
-class LogMsgThread(threading.Thread):
-	"""\
-	Print a logging message with timeout.
-	"""
-	def __init__(self, gui, msg, is_error=False,
-			show_sec=3):
-		super().__init__()
-		self.gui = gui		# RetroGui
-		self.msg = msg		# Text
-		self.err = is_error	# Is error?
-		self.sec = show_sec	# Seconds to show
-
-	def run(self):
-		win = self.gui.W['log']
-
-		self.__print_msg(win)
-		time_sleep(self.sec)
-		self.__clear(win)
-
-		if self.gui.chatView:
-			self.gui.chatView.reset_cursor()
-
-	def __print_msg(self, win):
-		with self.gui.winLock:
-			_,w = win.getmaxyx()
-			win.clear()
-
-			if self.err:
-				win.bkgd(' ', self.gui.colors['Wr'])
-			else:	win.bkgd(' ', self.gui.colors['Wb'])
-
-			win.addstr(0, 1, self.msg[:w-2], curses.A_BOLD)
-			win.refresh()
-
-	def __clear(self, win):
-		with self.gui.winLock:
-			win.clear()
-			win.bkgd(' ', self.gui.colors['Wb'])
-			win.refresh()
+		self.gui.request_redraw(self.gui.sidebar)
@@ -129,50 +129,47 @@ class SettingsWindow:
 
 
 	def __redraw_default_settings(self):
-		with self.gui.winLock:
-			h,w = self.W.getmaxyx()
-			self.W.clear()
-			self.__print_title(w)
+		h,w = self.W.getmaxyx()
+		self.W.erase()
+		self.__print_title(w)
 
-			for y,o in enumerate(self.defopts[self.vy:]):
-				if y > h-4: break
-				self.__print_default_option(o, y+3, self.vy+y)
+		for y,o in enumerate(self.defopts[self.vy:]):
+			if y > h-4: break
+			self.__print_default_option(o, y+3, self.vy+y)
 
-			self.W.addstr(h-2, 2, "Press [CTRL+X] to quit",
-					curses.A_DIM)
-			self.W.border()
-			self.W.refresh()
+		self.W.addstr(h-2, 2, "Press [CTRL+X] to quit",
+				curses.A_DIM)
+		self.W.border()
+		self.W.refresh()
 
 
 	def __redraw_sound_settings(self):
-		with self.gui.winLock:
-			h,w = self.W.getmaxyx()
-			self.W.clear()
-			self.__print_title(w)
+		h,w = self.W.getmaxyx()
+		self.W.erase()
+		self.__print_title(w)
 
-			for y,o in enumerate(self.sndopts):
-				if y > h-4: break
-				self.__print_sound_option(o, y+3, y)
+		for y,o in enumerate(self.sndopts):
+			if y > h-4: break
+			self.__print_sound_option(o, y+3, y)
 
-			self.W.addstr(h-2, 2, "Press [CTRL+X] to quit",
-					curses.A_DIM)
-			self.W.border()
-			self.W.refresh()
+		self.W.addstr(h-2, 2, "Press [CTRL+X] to quit",
+				curses.A_DIM)
+		self.W.border()
+		self.W.refresh()
 
 	def __redraw_notify_settings(self):
-		with self.gui.winLock:
-			h,w = self.W.getmaxyx()
-			self.W.clear()
-			self.__print_title(w)
-
-			for y,o in enumerate(self.notifyopts):
-				if y > h-4: break
-				self.__print_notify_option(o, y+3, y)
-
-			self.W.addstr(h-2, 2, "Press [CTRL+X] to quit",
-					curses.A_DIM)
-			self.W.border()
-			self.W.refresh()
+		h,w = self.W.getmaxyx()
+		self.W.erase()
+		self.__print_title(w)
+
+		for y,o in enumerate(self.notifyopts):
+			if y > h-4: break
+			self.__print_notify_option(o, y+3, y)
+
+		self.W.addstr(h-2, 2, "Press [CTRL+X] to quit",
+				curses.A_DIM)
+		self.W.border()
+		self.W.refresh()
 
 
 	def __print_default_option(self, opt, y, index):
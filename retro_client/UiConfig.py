@@ -42,6 +42,14 @@ UiSettings uses the following files:
   enabled = True
   timeout = 5
 
+  [network]
+  decrypt_workers = 2
+  single_thread = False
+  dead_timeout = 30
+
+  [render]
+  max_fps = 20
+
 """
 class UiConfig:
 
@@ -100,6 +108,21 @@ class UiConfig:
 		self.notify_enabled = True
 		self.notify_timeout = 5
 
+		# [network]
+		# Number of threads decrypting incoming messages,
+		# 0 means decrypting within the receive thread.
+		self.decrypt_workers = 2
+		# Poll the server socket within the main loop
+		# instead of running a receive thread?
+		self.single_thread = False
+		# Seconds after an unresponsive connection is closed
+		self.dead_timeout = 30
+
+		# [render]
+		# Max number of screen updates per second caused
+		# by background events (incoming messages, ...).
+		self.max_fps = 20
+
 
 	def load(self):
 		"""\
@@ -123,6 +146,19 @@ class UiConfig:
 					fallback=self.notify_timeout)
 			self.notify_enabled = conf.getboolean('notify',
 					'enabled', fallback=self.notify_enabled)
+			# [network]
+			self.decrypt_workers = conf.getint('network',
+					'decrypt_workers',
+					fallback=self.decrypt_workers)
+			self.single_thread = conf.getboolean('network',
+					'single_thread',
+					fallback=self.single_thread)
+			self.dead_timeout = conf.getint('network',
+					'dead_timeout',
+					fallback=self.dead_timeout)
+			# [render]
+			self.max_fps = conf.getint('render', 'max_fps',
+					fallback=self.max_fps)
 
 			return True
 		except configparser.NoOptionError as e:
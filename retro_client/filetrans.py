@@ -50,13 +50,17 @@ class SendFileThread(threading.Thread):
 			self.friend.name,
 			"Sent file '{}' ({})".format(
 			filename, filesize_to_string(filesize)))
-		self.cli.msgStore.add_msg(self.friend, msg)
+		msg['id'] = self.cli.msgStore.add_msg(self.friend, msg)
 
 		# Add message to conversation view
-		if self.gui.chatView:
-			self.gui.chatView.add_msg(msg)
+		self.gui.post(self.__show_msg, msg)
 
 
+	def __show_msg(self, msg):
+		# Add message to conversation view if opened
+		# or cached, executed by the main thread.
+		self.gui.chatCache.add_msg(self.friend, msg)
+
 
 class RecvFileThread(threading.Thread):
 	"""\
@@ -109,8 +113,14 @@ class RecvFileThread(threading.Thread):
 			self.gui.error("MsgStore: "+str(e))
 			return
 
-		# Reload chatview
-		if self.gui.chatView:
-			self.gui.chatView.load_chat(self.friend)
-			self.gui.chatView.wMsg.redraw()
-			self.gui.chatView.wIn.update_cursor()
+		# Update file message in conversation view
+		self.gui.post(self.__set_downloaded)
+
+
+	def __set_downloaded(self):
+		# Set file message downloaded in conversation
+		# view if opened or cached, executed by the main
+		# thread.
+		cV = self.gui.chatCache.get(self.friend)
+		if cV:
+			cV.set_file_downloaded(self.fileidx)
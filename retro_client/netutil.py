@@ -0,0 +1,148 @@
+import ssl
+import socket
+import threading
+
+"""\
+Network helpers.
+
+libretro keeps the TLS connection inside the RetroClient
+context and doesn't expose it directly. Some parts of the
+client (the receive thread's selector, for example) need
+the underlying socket (or TLS context), so here we dig it out.
+
+"""
+
+def get_socket(cli):
+	"""\
+	Get the socket of the connection to the retro server.
+	This searches the RetroClient context (and the objects
+	it holds) for an ssl.SSLSocket instance.
+
+	Args:
+	  cli: RetroClient instance
+	Return:
+	  The connected ssl.SSLSocket or None if not found
+	"""
+	return __find_instance(cli, ssl.SSLSocket)
+
+
+def get_ssl_context(cli):
+	"""\
+	Get the TLS context used to connect to the retro server.
+
+	Args:
+	  cli: RetroClient instance
+	Return:
+	  ssl.SSLContext or None if not found
+	"""
+	return __find_instance(cli, ssl.SSLContext)
+
+
+def __find_instance(cli, cls):
+	"""\
+	Search the RetroClient context (up to 3 levels deep)
+	for an instance of given class.
+	"""
+	candidates = [cli]
+	for depth in range(3):
+		found = []
+		for obj in candidates:
+			if not hasattr(obj, '__dict__'):
+				continue
+			for val in list(vars(obj).values()):
+				if isinstance(val, cls):
+					return val
+				elif hasattr(val, '__dict__') and\
+				     not isinstance(val, (type, socket.socket,
+						ssl.SSLContext)):
+					found.append(val)
+		candidates = found
+	return None
+
+
+class CorkedSocket:
+	"""\
+	Coalesce writes to a TLS socket.
+
+	While corked, everything written to the socket (by
+	RetroClient.send_packet(), for example) is collected
+	in a buffer. The buffer is written with a single
+	sendall() if it exceeds max_buf bytes or when leaving
+	the 'with' block. This way many small packets become
+	a few large TLS records and syscalls.
+
+	If the 'with' block raises, the data still buffered is
+	dropped, not written. Use position() to find out which
+	data was written (num_bytes) before the error.
+
+	Example:
+	  with CorkedSocket(get_socket(cli)):
+	      for pckt in pckts:
+	          cli.send_packet(*pckt)
+	"""
+	def __init__(self, sock, max_buf=64*1024):
+		"""\
+		Args:
+		  sock:    ssl.SSLSocket
+		  max_buf: Max bytes collected before writing
+		"""
+		self.sock    = sock
+		self.max_buf = max_buf
+		self.buf     = bytearray()
+		self.lock    = threading.Lock()
+		self.raw_sendall = sock.sendall # Unpatched sendall
+
+		# Stats
+		self.num_writes = 0	# Number of sendall() calls
+		self.num_bytes  = 0	# Number of bytes written
+
+
+	def __enter__(self):
+		self.sock.sendall = self.__sendall
+		self.sock.send    = self.__send
+		return self
+
+
+	def __exit__(self, exc_type, exc, tb):
+		del self.sock.sendall
+		del self.sock.send
+		if exc_type:
+			self.buf = bytearray()
+		else:
+			self.flush()
+		return False
+
+
+	def position(self):
+		"""\
+		Get number of bytes written plus buffered so far.
+		"""
+		with self.lock:
+			return self.num_bytes + len(self.buf)
+
+
+	def flush(self):
+		"""\
+		Write all collected data.
+		"""
+		with self.lock:
+			if not self.buf:
+				return
+			data     = bytes(self.buf)
+			self.buf = bytearray()
+			self.raw_sendall(data)
+			self.num_writes += 1
+			self.num_bytes  += len(data)
+
+
+	def __sendall(self, data, flags=0):
+		with self.lock:
+			self.buf += data
+			full = len(self.buf) >= self.max_buf
+		if full:
+			self.flush()
+
+
+	def __send(self, data, flags=0):
+		self.__sendall(data, flags)
+		return len(data)
@@ -33,7 +33,7 @@ class DialogWindow:
 
 		Args:
 		  parent:   Underlying curses window
-		  lock:     Lock for parent window
+		  lock:     Lock for parent window (optional)
 		  keys:     See Keyboard.py
 		  title:    Window title message
 		  body:     Window body message
@@ -43,7 +43,7 @@ class DialogWindow:
 		tw = textwrap.TextWrapper(36)
 
 		self.parent = parent
-		self.lock   = lock
+		self.lock   = lock if lock else threading.Lock()
 		self.keys   = keys
 		self.title  = title
 		self.body   = tw.wrap(body) # Wrap body text to list
@@ -107,7 +107,7 @@ class DialogWindow:
 		"""
 		with self.lock:
 			h,w = self.W.getmaxyx()
-			self.W.clear()
+			self.W.erase()
 			self.W.addstr(1, 1, ' '+self.title+' '*(w-3-len(self.title)),
 					curses.A_REVERSE)
 
@@ -21,13 +21,13 @@ class EntryBoxWindow:
 		"""\
 		Args:
 		  parent: Underlying curses window
-		  lock:   Lock for parent window
+		  lock:   Lock for parent window (optional)
 		  keys:   Keyboard (see Keyboard.py)
 		  title:  Title
 		"""
 
 		self.parent = parent
-		self.lock   = lock
+		self.lock   = lock if lock else threading.Lock()
 		self.keys   = keys
 		self.title  = title
 		self.ispass = is_password
@@ -97,7 +97,7 @@ class EntryBoxWindow:
 
 		self.lock.acquire()
 		try:
-			self.W.clear()
+			self.W.erase()
 			self.W.addstr(1, 1, title, curses.A_REVERSE)
 
 			if self.ispass:
@@ -23,12 +23,12 @@ class FileBrowseWindow:
 		"""\
 		Args:
 		  parent: Underlying curses window
-		  lock:   Window thread lock
+		  lock:   Window thread lock (optional)
 		  keys:   Keyboard instance (See ncui/Keyboard.py)
 		"""
 
 		self.parent = parent
-		self.lock   = lock
+		self.lock   = lock if lock else Lock()
 		self.keys   = keys
 		self.title  = title
 
@@ -123,7 +123,7 @@ class FileBrowseWindow:
 			h,w = self.W.getmaxyx()
 			dirpath  = self.dirpath[-(w-2):]
 
-			self.W.clear()
+			self.W.erase()
 			self.W.addstr(1, 2, self.title, curses.A_BOLD)
 			self.W.addstr(2, 1, dirpath + " "*(w-len(dirpath)-2),
 				curses.A_REVERSE)
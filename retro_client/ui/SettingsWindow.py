@@ -39,11 +39,11 @@ class SelectOptionWindow:
 		"""\
 		Args:
 		  parent: Underlying curses window
-		  lock: Parent window lock
+		  lock: Parent window lock (optional)
 		"""
 
 		self.parent = parent
-		self.lock   = lock
+		self.lock   = lock if lock else Lock()
 		self.keys   = keys
 		self.title  = title
 		self.opts   = options
@@ -114,7 +114,7 @@ class SelectOptionWindow:
 		try:
 			h,w = self.W.getmaxyx()
 
-			self.W.clear()
+			self.W.erase()
 			self.W.addstr(1, 1, ' '+self.title+' '*(w-len(self.title)-2),
 				curses.A_REVERSE)
 
@@ -29,12 +29,13 @@ class TextEditWindow:
 
 		self.W.keypad(True)
 
+		# Not refreshed here, the window may be hidden
+		# yet. It's shown by redraw() or clear().
 		if self.lock:
 			self.lock.acquire()
 		try:
-			self.W.clear()
+			self.W.erase()
 			self.W.move(0, 0)
-			self.W.refresh()
 		finally:
 			if self.lock:
 				self.lock.release()
@@ -102,7 +103,7 @@ class TextEditWindow:
 		if self.lock:
 			self.lock.acquire()
 		try:
-			self.W.clear()
+			self.W.erase()
 			if not clear_border:
 				self.W.border()
 			self.W.refresh()
@@ -114,6 +115,8 @@ class TextEditWindow:
 	def redraw(self):
 		"""\
 		Render text.
+		NOTE: The window is refreshed with noutrefresh(),
+		      call curses.doupdate() afterwards.
 		"""
 		h,w = self.W.getmaxyx()
 
@@ -125,7 +128,7 @@ class TextEditWindow:
 		if self.lock:
 			self.lock.acquire()
 		try:
-			self.W.clear()
+			self.W.erase()
 			if self.border:
 				max_h -= 2
 				max_w -= 2
@@ -141,7 +144,7 @@ class TextEditWindow:
 				if li - self.vy >= max_h: break
 				self.W.addstr(li-self.vy+dy, dx, self.lines[li])
 
-			self.W.refresh()
+			self.W.noutrefresh()
 		except:
 			# Screen too small
 			pass
@@ -153,9 +156,11 @@ class TextEditWindow:
 	def update_cursor(self):
 		"""\
 		Updates the cursor position to self.cy/self.cx.
+		NOTE: The screen is updated by the next
+		      curses.doupdate().
 		"""
 		self.W.move(self.cy-self.vy+2, self.cx+1)
-		self.W.refresh()
+		self.W.noutrefresh()
 
 
 	# ------------------------------------------------------------
@@ -2,6 +2,7 @@ import curses
 from threading import Lock
 import textwrap
 
+from . markup import compile_markup, draw_runs
 
 """\
 HelpWindow
@@ -21,13 +22,13 @@ class TextWindow:
 		"""\
 		Args:
 		  parent: Underlying curses window
-		  lock:   Window lock
+		  lock:   Window lock (optional)
 		  keys:   Class Keyboard (see Keyboard.py)
 		  title:  Window title
 		"""
 
 		self.parent = parent
-		self.lock   = lock
+		self.lock   = lock if lock else Lock()
 		self.keys   = keys
 		self.title  = title
 
@@ -103,7 +104,7 @@ class TextWindow:
 		try:
 			h,w = self.W.getmaxyx()
 
-			self.W.clear()
+			self.W.erase()
 			self.W.addstr(1, 1, " "+self.title \
 				+ ' '*(w-3-len(self.title)),
 				curses.A_REVERSE)
@@ -130,17 +131,10 @@ class TextWindow:
 	def __print_line(self, y, x, line, attr=0):
 		"""\
 		Print text to given window at y/x position.
-		This supports the following expression for styled
-		text ouput:
-
-		  **TEXT**      Bold text
-		  __TEXT__      Underlined text
-		  ??TEXT??      Dimmed text
-		  ~~TEXT~~      Reverse text
-		  ##TEXT##      Blinking text
+		This supports styled text output (see markup.py),
+		the markup may continue on the next line.
 
 		Args:
-		  win:	Curses window instance
 		  y:	Y position in window
 		  x:	X position in window
 		  line: Line string
@@ -149,35 +143,8 @@ class TextWindow:
 		Return:
 		  Last used attributes
 		"""
-
-		# All string are placed between 2 of
-		# the following characters, it has an attribute.
-		SPEC = {
-			'**' : curses.A_BOLD,
-			'??' : curses.A_DIM,
-			'~~' : curses.A_REVERSE,
-			'__' : curses.A_UNDERLINE,
-			'##' : curses.A_BLINK
-		}
-
-		active = {}
-		for key in SPEC.keys(): active[key] = 0
-
-		i = 0
-		self.W.move(y, x)
-		while i < len(line):
-			ch = line[i]
-			if line[i:i+2] in SPEC:
-				# Found one of '**', '~~', ...
-				# So let's either turn on or off attributes
-				spec = line[i:i+2]
-				if (attr & SPEC[spec]):
-					attr &= ~SPEC[spec]
-				else:	attr |= SPEC[spec]
-				i += 2
-			else:
-				self.W.addch(ch, attr)
-				i += 1
+		runs,attr = compile_markup(line, attr)
+		draw_runs(self.W, y, x, runs)
 		return attr
 
 
@@ -0,0 +1,70 @@
+import curses
+import re
+
+from functools import lru_cache
+
+"""\
+Markup for styled text output.
+
+A text placed between two of the following marks is printed
+with the mark's attribute:
+
+  **TEXT**      Bold text
+  __TEXT__      Underlined text
+  ??TEXT??      Dimmed text
+  ~~TEXT~~      Reverse text
+  ##TEXT##      Blinking text
+
+A line is compiled once to a list of (text, attr) runs and the
+result is cached, so redrawing a line costs one addstr() per
+run instead of one addch() per character.
+
+Example:
+	runs,attr = compile_markup("Press **CTRL+X** to quit")
+	draw_runs(W, y, x, runs)
+
+"""
+
+MARKS = {
+	'**' : curses.A_BOLD,
+	'??' : curses.A_DIM,
+	'~~' : curses.A_REVERSE,
+	'__' : curses.A_UNDERLINE,
+	'##' : curses.A_BLINK
+}
+
+MARK_RE = re.compile('|'.join(re.escape(m) for m in MARKS))
+
+
+@lru_cache(maxsize=4096)
+def compile_markup(line, attr=0):
+	"""\
+	Split line into styled runs.
+
+	Args:
+	  line: Line string
+	  attr: Attributes active at the start of the line
+	Return:
+	  Tuple (tuple of (text, attr) runs, attributes
+	  active at the end of the line)
+	"""
+	runs = []
+	pos  = 0
+	for m in MARK_RE.finditer(line):
+		if m.start() > pos:
+			runs.append((line[pos:m.start()], attr))
+		attr ^= MARKS[m.group()]
+		pos   = m.end()
+	if pos < len(line):
+		runs.append((line[pos:], attr))
+	return tuple(runs),attr
+
+
+def draw_runs(W, y, x, runs):
+	"""\
+	Draw compiled runs (see compile_markup()) to
+	window W at y/x position.
+	"""
+	W.move(y, x)
+	for text,attr in runs:
+		W.addstr(text, attr)